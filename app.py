@@ -1,51 +1,1445 @@
+from abc import ABC, abstractmethod
+import argparse
 import asyncio
 import json
-from groq import Groq
+from contextlib import asynccontextmanager, contextmanager
+import contextvars
+from groq import AsyncGroq
 from openai import AsyncOpenAI
 import ollama
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 import pandas as pd
 from openpyxl import Workbook
 from openpyxl.chart import BarChart, Reference
-from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.styles import Font, Alignment, PatternFill, NamedStyle
+from openpyxl.formatting.rule import FormulaRule
 from openpyxl.utils import get_column_letter
+import xlsxwriter
 from datetime import datetime
 import re
 import uuid
 import logging
 import os
+import random
+import sqlite3
+import sys
+import concurrent.futures
+import functools
+import io
+import itertools
+import math
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict, deque
 
-# Configure logging
-log_dir = "logs"
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
-
-log_file = os.path.join(log_dir, f"query_processor_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
-logger.info("Logging initialized at %s", datetime.now().strftime('%Y-%m-%d %H:%M:%S %Z'))
+
+
+def configure_logging(log_dir="logs"):
+    """Log to stderr and to a timestamped file in log_dir"""
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    log_file = os.path.join(log_dir, f"query_processor_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+    logger.info("Logging initialized at %s", datetime.now().strftime('%Y-%m-%d %H:%M:%S %Z'))
+
+
+# Spawned report workers re-import this module; only the main process sets up logging and its log file
+if multiprocessing.current_process().name == "MainProcess":
+    configure_logging()
+
+# Collects every item's fields in the page and returns them as one JSON array
+BATCH_EXTRACT_JS = """
+([itemSelector, fields, limit]) => {
+    const items = document.querySelectorAll(itemSelector);
+    const rows = [];
+    for (let i = 0; i < items.length && i < limit; i++) {
+        const row = {};
+        for (const [name, selector] of Object.entries(fields)) {
+            const el = items[i].querySelector(selector);
+            row[name] = el ? el.innerText : null;
+        }
+        rows.push(row);
+    }
+    return {count: items.length, items: rows};
+}
+"""
+
+
+# Requests aborted on scraping pages; the scraper only reads text, so heavy assets and trackers are dead weight
+DEFAULT_BLOCKING_PROFILE = {
+    'resource_types': ['image', 'media', 'font'],
+    'url_patterns': [
+        r'doubleclick\.net', r'googlesyndication\.com', r'google-analytics\.com', r'googletagmanager\.com',
+        r'facebook\.(net|com)/tr', r'amazon-adsystem\.com', r'/beacon', r'/batch/1/OE/', r'fls-[a-z]+\.amazon\.',
+    ],
+}
+
+# Rough transfer size per blocked request, used to estimate bytes saved (aborted requests report no size)
+ESTIMATED_RESOURCE_BYTES = {
+    'image': 30000,
+    'media': 500000,
+    'font': 40000,
+    'script': 25000,
+    'stylesheet': 15000,
+}
+ESTIMATED_OTHER_BYTES = 2000
+
+
+class ResourceBlocker:
+    def __init__(self, profile):
+        """
+        Route handler aborting requests by resource type and URL pattern.
+        Args:
+            profile (dict): 'resource_types' (list of Playwright resource types) and 'url_patterns' (list of regexes)
+        """
+        self.resource_types = set(profile.get('resource_types', []))
+        self.url_pattern = None
+        if profile.get('url_patterns'):
+            self.url_pattern = re.compile('|'.join(f'(?:{p})' for p in profile['url_patterns']))
+        self.allowed_requests = 0
+        self.blocked_requests = 0
+        self.estimated_bytes_saved = 0
+
+    @property
+    def stats(self):
+        return {
+            'allowed_requests': self.allowed_requests,
+            'blocked_requests': self.blocked_requests,
+            'estimated_bytes_saved': self.estimated_bytes_saved,
+        }
+
+    def should_block(self, resource_type, url):
+        if resource_type in self.resource_types:
+            return True
+        return bool(self.url_pattern and self.url_pattern.search(url))
+
+    async def handle(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.blocked_requests += 1
+            self.estimated_bytes_saved += ESTIMATED_RESOURCE_BYTES.get(request.resource_type, ESTIMATED_OTHER_BYTES)
+            await route.abort()
+        else:
+            self.allowed_requests += 1
+            await route.continue_()
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, int(math.ceil(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LatencyRecorder:
+    def __init__(self, jsonl_path=None, max_records=100000, flush_interval=1.0):
+        """
+        Records nested stage durations (spans) per query.
+        Args:
+            jsonl_path (str): Append every finished span to this JSON Lines file (optional); the file is
+                kept open and buffered, so call close() when done
+            max_records (int): Finished spans kept in memory for summaries and export
+            flush_interval (float): Seconds between flushes of the JSON Lines file
+        """
+        self.jsonl_path = jsonl_path
+        self.records = deque(maxlen=max_records)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._handle = None
+        self._last_flush = time.monotonic()
+        if jsonl_path:
+            directory = os.path.dirname(jsonl_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+
+    @contextmanager
+    def bind(self, trace_id):
+        """Make spans opened inside this block belong to trace_id"""
+        token = _current_span.set((trace_id, ""))
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time the enclosed block; spans opened inside it (including in child tasks) nest under it.
+        Yields the span's attribute dict, so the block can add fields recorded when the span finishes.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            trace_id, path = uuid.uuid4().hex[:12], name
+        else:
+            trace_id, path = parent[0], f"{parent[1]}/{name}" if parent[1] else name
+        token = _current_span.set((trace_id, path))
+        started_at = time.time()
+        started = time.perf_counter()
+        error = None
+        try:
+            yield attributes
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_span.reset(token)
+            record = {
+                'trace_id': trace_id,
+                'span': name,
+                'path': path,
+                'start': round(started_at, 6),
+                'seconds': round(elapsed, 6),
+            }
+            if error:
+                record['error'] = error
+            if attributes:
+                record.update(attributes)
+            self._finish(record)
+
+    def _finish(self, record):
+        with self._lock:
+            self.records.append(record)
+            if self.jsonl_path:
+                if self._handle is None:
+                    self._handle = open(self.jsonl_path, 'a', encoding='utf-8')
+                self._handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._flush()
+
+    def _flush(self):
+        if self._handle is not None:
+            self._handle.flush()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Write buffered spans to the JSON Lines file"""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Flush and close the JSON Lines file (it is reopened if more spans finish)"""
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+    def export_jsonl(self, path):
+        """Write all recorded spans to a JSON Lines file"""
+        with self._lock:
+            records = list(self.records)
+        with open(path, 'w', encoding='utf-8') as handle:
+            for record in records:
+                handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return path
+
+    def summary(self):
+        """Count, mean, p50/p95/p99 and max seconds per span name, slowest total first"""
+        with self._lock:
+            records = list(self.records)
+        durations = {}
+        for record in records:
+            # Step spans are summarized per command, e.g. 'step:browser_navigate'
+            name = f"{record['span']}:{record['command']}" if 'command' in record else record['span']
+            durations.setdefault(name, []).append(record['seconds'])
+        summary = []
+        for name, values in durations.items():
+            values.sort()
+            summary.append({
+                'span': name,
+                'count': len(values),
+                'total_seconds': round(sum(values), 4),
+                'mean_seconds': round(sum(values) / len(values), 4),
+                'p50_seconds': round(_percentile(values, 0.50), 4),
+                'p95_seconds': round(_percentile(values, 0.95), 4),
+                'p99_seconds': round(_percentile(values, 0.99), 4),
+                'max_seconds': round(values[-1], 4),
+            })
+        return sorted(summary, key=lambda row: row['total_seconds'], reverse=True)
+
+
+def traced(name):
+    """Decorator recording an async QueryProcessor method as a latency span"""
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            with self.latency.span(name):
+                return await method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ParseCache:
+    def __init__(self, path=os.path.join("cache", "parse_cache.sqlite3"), ttl=24 * 3600, max_entries=10000,
+                 memory_entries=256, commit_every=100, commit_interval=5.0):
+        """
+        Two-level cache for parsed queries: in-memory LRU in front of an on-disk SQLite store.
+        Writes and access-time updates are committed in batches, so call close() to persist the last batch.
+        Args:
+            path (str): SQLite file path (':memory:' keeps the store in RAM only)
+            ttl (float): Seconds an entry stays valid
+            max_entries (int): Maximum number of entries kept on disk (least recently used are evicted)
+            memory_entries (int): Maximum number of entries kept in the in-memory LRU
+            commit_every (int): Commit after this many pending writes
+            commit_interval (float): Commit pending writes at least this often, in seconds
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        # Access times of hits not yet written to SQLite, applied before every eviction and commit
+        self._touched = {}
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if path != ":memory:" and directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parse_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        logger.info("Parse cache opened at %s", path)
+
+    @staticmethod
+    def normalize(query):
+        """Normalize a query so trivial variations (case, spacing, trailing punctuation) share an entry"""
+        return ' '.join(query.lower().split()).rstrip('?.! ')
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self._touch(key, now)
+                    self.hits += 1
+                    return json.loads(value)
+                del self._memory[key]
+            row = self._conn.execute("SELECT value, created_at FROM parse_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                if row is not None:
+                    self._touched.pop(key, None)
+                    self._conn.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+                    self._write()
+                self.misses += 1
+                return None
+            self._touch(key, now)
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        """Store value (any JSON-serializable object) under key"""
+        now = time.time()
+        serialized = json.dumps(value)
+        with self._lock:
+            self._remember(key, serialized, now)
+            self._touched.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parse_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, serialized, now, now)
+            )
+            # Recent hits must be on disk before choosing which entries to evict
+            self._apply_touches()
+            self._conn.execute(
+                "DELETE FROM parse_cache WHERE key IN "
+                "(SELECT key FROM parse_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._write()
+
+    def _touch(self, key, now):
+        self._touched[key] = now
+        self._write()
+
+    def _apply_touches(self):
+        if self._touched:
+            self._conn.executemany("UPDATE parse_cache SET accessed_at = ? WHERE key = ?",
+                                   [(accessed_at, key) for key, accessed_at in self._touched.items()])
+            self._touched.clear()
+
+    def _write(self):
+        """Count one pending write and commit the batch once it is large or old enough"""
+        self._pending_writes += 1
+        if (self._pending_writes >= self.commit_every
+                or time.monotonic() - self._last_commit >= self.commit_interval):
+            self._commit()
+
+    def _commit(self):
+        self._apply_touches()
+        self._conn.commit()
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+
+    def flush(self):
+        """Commit pending writes and access times to disk"""
+        with self._lock:
+            self._commit()
+
+    def _remember(self, key, serialized, created_at):
+        self._memory[key] = (serialized, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._conn.execute("DELETE FROM parse_cache")
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'memory_entries': len(self._memory),
+        }
+
+
+class RuleBasedQueryParser:
+    """Deterministic parser for common '<product> under <budget> on <site>' queries, used before the LLM"""
+
+    LEADING_PHRASE = re.compile(
+        r'^(?:please\s+)?(?:can you\s+)?(?:find|search|show|get|look|looking|list|buy|compare|check|i want|i need)'
+        r'(?:\s+(?:me|for|up))*(?:\s+(?:the\s+)?(?:best\s+)?(?:prices?|deals?)\s+(?:of|for|on))?\s+',
+        re.IGNORECASE
+    )
+    BUDGET = re.compile(
+        r'\b(?:under|below|less than|within|up ?to|upto|cheaper than|max(?:imum)?)\s*'
+        r'(₹|rs\.?|inr|\$|usd)?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|thousand|lakhs?|lacs?|crores?|cr)?\b\s*'
+        r'(rupees|rs\.?|inr|dollars|usd)?',
+        re.IGNORECASE
+    )
+    # Amount multipliers keyed by the first letter of the unit word
+    BUDGET_UNITS = {'k': 1000, 't': 1000, 'l': 100000, 'c': 10000000}
+    COMPARISON = re.compile(r'\b(?:compare|comparison|price of|prices of|cheapest)\b', re.IGNORECASE)
+    FLIGHT = re.compile(r'\b(?:flights?|airfare|plane tickets?)\b', re.IGNORECASE)
+    FILLER = re.compile(r'\b(?:on|across|both|and|or|between|sites?|websites?)\b', re.IGNORECASE)
+    DETERMINER = re.compile(r'\b(?:the|a|an|some|any|my|our)\b', re.IGNORECASE)
+    # Ranking words ('cheapest phones') ask for something the parsed fields cannot express
+    QUALIFIER = re.compile(r'\b(?:cheapest|cheap|best|top|latest|newest|popular|good|nice)\b', re.IGNORECASE)
+    # Prepositions left over once sites are removed introduce details the rules do not understand ('in Goa')
+    UNRECOGNIZED = re.compile(r'\b(?:in|at|from|near|for|with|without|to|by)\b', re.IGNORECASE)
+
+    def __init__(self, supported_sites):
+        self.supported_sites = list(supported_sites)
+        self.site_pattern = re.compile(r'\b(' + '|'.join(re.escape(site) for site in self.supported_sites) + r')\b',
+                                       re.IGNORECASE)
+        # A site together with its preposition ('on amazon', 'from flipkart') carries no product information
+        self.site_phrase = re.compile(r'(?:\b(?:on|from|at|in|across|via)\s+)?' + self.site_pattern.pattern,
+                                      re.IGNORECASE)
+        self.attempts = 0
+        self.accepted = 0
+
+    def parse(self, query):
+        """Return (parsed_result, confidence); parsed_result is None when the query is not recognized"""
+        text = ' '.join(query.split())
+        if not text or self.FLIGHT.search(text):
+            return None, 0.0
+        confidence = 0.4
+
+        query_type = "price_comparison" if self.COMPARISON.search(text) else "product_search"
+        leading = self.LEADING_PHRASE.match(text)
+        if leading:
+            confidence += 0.1
+            text = text[leading.end():]
+
+        budget = None
+        budget_match = self.BUDGET.search(text)
+        if budget_match:
+            symbol = budget_match.group(1) or budget_match.group(4) or '₹'
+            amount = float(budget_match.group(2).replace(',', ''))
+            if budget_match.group(3):
+                amount *= self.BUDGET_UNITS[budget_match.group(3)[0].lower()]
+            currency = '$' if symbol.lower() in ('$', 'usd', 'dollars') else '₹'
+            budget = f"{currency}{amount:g}" if amount != int(amount) else f"{currency}{int(amount)}"
+            text = text[:budget_match.start()] + ' ' + text[budget_match.end():]
+            confidence += 0.2
+
+        sites = []
+        for match in self.site_pattern.finditer(text):
+            site = match.group(1).lower()
+            if site not in sites:
+                sites.append(site)
+        if sites:
+            confidence += 0.2
+            text = self.site_phrase.sub(' ', text)
+
+        if self.QUALIFIER.search(text):
+            confidence -= 0.3
+        if self.UNRECOGNIZED.search(text):
+            confidence -= 0.3
+        product = self.COMPARISON.sub(' ', text)
+        for pattern in (self.QUALIFIER, self.DETERMINER, self.UNRECOGNIZED, self.FILLER):
+            product = pattern.sub(' ', product)
+        product = ' '.join(re.sub(r'[^\w\s\-+.]', ' ', product).split()).strip(' .')
+        if not product:
+            return None, 0.0
+        words = len(product.split())
+        if words <= 4:
+            confidence += 0.2
+        elif words > 8:
+            confidence -= 0.3
+
+        search_params = {"category": None, "budget": budget, "specific_product": None}
+        if query_type == "price_comparison":
+            search_params["specific_product"] = product
+        else:
+            search_params["category"] = product
+        parsed_result = {
+            "query_type": query_type,
+            "target_websites": sites or list(self.supported_sites),
+            "search_params": search_params,
+        }
+        return parsed_result, round(min(max(confidence, 0.0), 1.0), 2)
+
+    @property
+    def stats(self):
+        return {
+            'attempts': self.attempts,
+            'fast_path': self.accepted,
+            'llm_fallback': self.attempts - self.accepted,
+            'coverage': self.accepted / self.attempts if self.attempts else 0.0,
+        }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls sharing a key into one execution whose result every caller receives"""
+
+    def __init__(self):
+        self._in_flight = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, func):
+        """Await func() for key, or join the call already in flight for the same key"""
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+            logger.debug("Joining in-flight call for key: %s", key)
+        # shield so one cancelled waiter does not cancel the shared work for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+
+CURRENCY_CODES = {
+    '₹': 'INR', 'rs': 'INR', 'inr': 'INR',
+    '$': 'USD', 'usd': 'USD',
+    '€': 'EUR', 'eur': 'EUR',
+    '£': 'GBP', 'gbp': 'GBP',
+}
+
+
+def _parse_amounts(text):
+    """Vectorized conversion of price strings to floats (NaN when no number is present)"""
+    # Separators are only meaningful between digits ('Rs. 999' leaves a stray leading dot)
+    digits = text.str.replace(r'[^\d.,]', '', regex=True).str.strip('.,')
+    # '1.299,00' / '12,50' style: dots group thousands and the comma is the decimal separator
+    european = digits.str.fullmatch(r'\d{1,3}(?:\.\d{3})*,\d{1,2}').fillna(False).astype(bool)
+    digits = digits.where(~european, digits.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    digits = digits.str.replace(',', '', regex=False)
+    return pd.to_numeric(digits, errors='coerce').astype('float64')
+
+
+def normalize_prices(prices):
+    """
+    Parse a whole column of scraped price strings at once.
+    Handles currency symbols/codes, thousands separators (including Indian and European grouping),
+    ranges such as '₹1,000 - ₹2,000' and placeholders such as 'N/A'.
+    Args:
+        prices (iterable): Raw price strings
+    Returns:
+        DataFrame: 'price_value' (float, low end of a range), 'price_max' (float, high end) and
+        'currency' (ISO code) columns; missing values are NaN/None
+    """
+    text = pd.Series(list(prices), dtype='object').astype('string').str.strip()
+    currency = (text.str.extract(r'(₹|\$|€|£|\b(?:rs|inr|usd|eur|gbp)\b)', flags=re.IGNORECASE)[0]
+                .str.lower().map(CURRENCY_CODES))
+    parts = text.str.extract(r'^(?P<low>.*?\d.*?)(?:\s*(?:-|–|—|\bto\b)\s*(?P<high>\D*\d.*))?$',
+                             flags=re.IGNORECASE)
+    low = _parse_amounts(parts['low'])
+    high = _parse_amounts(parts['high']).fillna(low)
+    return pd.DataFrame({
+        'price_value': low,
+        'price_max': high,
+        'currency': currency.astype('object').where(currency.notna(), None),
+    })
+
+
+def add_price_columns(records):
+    """Attach normalized 'price_value' and 'currency' fields to scraped records in place"""
+    if not records:
+        return records
+    normalized = normalize_prices(record['price'] for record in records)
+    for record, value, currency in zip(records, normalized['price_value'], normalized['currency']):
+        record['price_value'] = None if pd.isna(value) else float(value)
+        record['currency'] = currency
+    return records
+
+
+def _price_values(df):
+    """Numeric prices for a results DataFrame, reusing values normalized at scrape time when present"""
+    if 'price_value' in df.columns and df['price_value'].notna().any():
+        return pd.to_numeric(df['price_value'], errors='coerce')
+    return normalize_prices(df['price'])['price_value']
+
+
+# Record fields written to the report, in column order
+REPORT_COLUMNS = ['site', 'title', 'price', 'timestamp']
+
+
+def _column_widths(df, columns, headers, max_width=60, percentile=None, sample_size=10000):
+    """
+    Column widths computed from the string lengths of the result data with vectorized pandas ops.
+    Args:
+        df (DataFrame): Result data
+        columns (list): DataFrame columns, in sheet order
+        headers (list): Header labels (a column is never narrower than its header)
+        max_width (int): Upper bound for any column width
+        percentile (float): Size columns to this length percentile (0-100) instead of the maximum
+        sample_size (int): Rows sampled for the percentile on large data
+    """
+    widths = []
+    for column, header in zip(columns, headers):
+        length = 0
+        if column in df.columns and not df.empty:
+            values = df[column]
+            if percentile is not None and len(values) > sample_size:
+                values = values.sample(sample_size, random_state=0)
+            lengths = values.astype(str).str.len()
+            length = lengths.quantile(percentile / 100) if percentile is not None else lengths.max()
+        widths.append(min(max(int(math.ceil(length)), len(header)) + 2, max_width))
+    return widths
+
+
+def build_excel_report(data, query, streaming=None, streaming_report_threshold=50000, max_column_width=60,
+                       width_percentile=None, output=None):
+    """Generate Excel report with data, charts, and conditional formatting; output is a path or file-like object"""
+    if streaming is None:
+        streaming = not hasattr(data, '__len__') or len(data) >= streaming_report_threshold
+    if streaming:
+        return _build_streaming_excel_report(data, query, output=output, max_column_width=max_column_width,
+                                             width_percentile=width_percentile)
+    logger.info("Creating Excel report for query: %s", query)
+    try:
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Query Results"
+
+        # Headers share one named style instead of per-cell font/alignment/fill objects
+        header_style = NamedStyle(name="report_header")
+        header_style.font = Font(bold=True)
+        header_style.alignment = Alignment(horizontal='center')
+        header_style.fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
+        wb.add_named_style(header_style)
+        headers = ['Site', 'Product Title', 'Price', 'Timestamp', 'Price Value']
+        for col, header in enumerate(headers, 1):
+            cell = ws.cell(row=1, column=col)
+            cell.value = header
+            cell.style = "report_header"
+        logger.debug("Excel headers set: %s", headers)
+
+        # Data (the hidden numeric 'Price Value' column backs the highlight rule and the chart)
+        df = pd.DataFrame(data)
+        prices = _price_values(df) if not df.empty else pd.Series(dtype='float64')
+        for row, (record, price_value) in enumerate(zip(data, prices), 2):
+            ws.cell(row=row, column=1).value = record['site']
+            ws.cell(row=row, column=2).value = record['title']
+            ws.cell(row=row, column=3).value = record['price']
+            ws.cell(row=row, column=4).value = record['timestamp']
+            if pd.notna(price_value):
+                ws.cell(row=row, column=5).value = float(price_value)
+        ws.column_dimensions['E'].hidden = True
+        logger.debug("Wrote %d rows to Excel", len(data))
+
+        # Conditional formatting: Highlight prices below average with one worksheet-level rule
+        # (the average is a live formula, so the highlight follows edits to the sheet)
+        last_row = len(data) + 1
+        if not df.empty:
+            ws.conditional_formatting.add(f"C2:C{last_row}", FormulaRule(
+                formula=[f"AND(ISNUMBER($E2),$E2<AVERAGE($E$2:$E${last_row}))"],
+                fill=PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
+            ))
+
+        # Add filter
+        ws.auto_filter.ref = f"A1:D{last_row}"
+        logger.debug("Auto-filter applied to Excel sheet")
+
+        # Create bar chart
+        if not df.empty:
+            chart = BarChart()
+            chart.title = "Price Comparison by Site"
+            chart.x_axis.title = "Product"
+            chart.y_axis.title = "Price"
+            # The plotted column E is hidden, and Excel skips hidden cells by default
+            chart.visible_cells_only = False
+
+            chart_data = Reference(ws, min_col=5, min_row=1, max_row=len(data)+1)
+            chart_cats = Reference(ws, min_col=2, min_row=2, max_row=len(data)+1)
+            chart.add_data(chart_data, titles_from_data=True)
+            chart.set_categories(chart_cats)
+            ws.add_chart(chart, "F5")
+            logger.debug("Bar chart added to Excel")
+
+        # Auto-adjust column widths from the in-memory data rather than walking every cell
+        widths = _column_widths(df, REPORT_COLUMNS, headers[:4], max_width=max_column_width, percentile=width_percentile)
+        for col, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(col)].width = width
+        logger.debug("Adjusted column widths in Excel")
+
+        # Save file
+        if output is None:
+            output = f"query_report_{uuid.uuid4().hex[:8]}.xlsx"
+        wb.save(output)
+        logger.info("Excel report saved: %s", output)
+        return output
+    except Exception as e:
+        logger.error("Error creating Excel report: %s", str(e), exc_info=True)
+        raise
+
+def _build_streaming_excel_report(data, query, output=None, chart_max_rows=100, chunk_size=10000, max_column_width=60,
+                                  width_percentile=None):
+    """
+    Generate the Excel report with XlsxWriter's constant_memory mode.
+    Rows are flushed to disk as they are written, so data may be any iterable (including a generator)
+    and memory stays bounded regardless of row count. A hidden numeric price column backs the
+    below-average highlight and the chart, which covers the first chart_max_rows rows.
+    XlsxWriter cannot combine constant_memory with file-like output, so an in-memory target buffers the sheet.
+    """
+    logger.info("Creating streaming Excel report for query: %s", query)
+    if output is None:
+        output = f"query_report_{uuid.uuid4().hex[:8]}.xlsx"
+    if isinstance(output, (str, os.PathLike)):
+        wb = xlsxwriter.Workbook(output, {'constant_memory': True})
+    else:
+        wb = xlsxwriter.Workbook(output, {'in_memory': True})
+    try:
+        ws = wb.add_worksheet("Query Results")
+        header_format = wb.add_format({'bold': True, 'align': 'center', 'bg_color': '#D3D3D3'})
+        highlight_format = wb.add_format({'bg_color': '#90EE90'})
+
+        headers = ['Site', 'Product Title', 'Price', 'Timestamp', 'Price Value']
+        ws.write_row(0, 0, headers, header_format)
+        widths = [len(header) + 2 for header in headers[:4]]
+
+        rows = 0
+        records = iter(data)
+        # Records are consumed in fixed-size chunks so prices can be normalized column-wise
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+            chunk_df = pd.DataFrame(chunk)
+            prices = _price_values(chunk_df)
+            chunk_widths = _column_widths(chunk_df, REPORT_COLUMNS, headers[:4], max_width=max_column_width,
+                                          percentile=width_percentile)
+            widths = [max(width, chunk_width) for width, chunk_width in zip(widths, chunk_widths)]
+            for record, numeric in zip(chunk, prices):
+                rows += 1
+                ws.write_row(rows, 0, [record['site'], record['title'], record['price'], record['timestamp']])
+                if pd.notna(numeric):
+                    ws.write_number(rows, 4, numeric)
+        logger.debug("Streamed %d rows to Excel", rows)
+
+        for col, width in enumerate(widths):
+            ws.set_column(col, col, width)
+        ws.set_column(4, 4, None, None, {'hidden': True})
+
+        if rows:
+            # Conditional formatting: Highlight prices below average
+            ws.conditional_format(1, 2, rows, 2, {
+                'type': 'formula',
+                'criteria': f'=AND(ISNUMBER($E2),$E2<AVERAGE($E$2:$E${rows + 1}))',
+                'format': highlight_format,
+            })
+            ws.autofilter(0, 0, rows, 3)
+
+            chart = wb.add_chart({'type': 'column'})
+            chart.set_title({'name': "Price Comparison by Site"})
+            chart.set_x_axis({'name': "Product"})
+            chart.set_y_axis({'name': "Price"})
+            # The plotted column E is hidden, and Excel skips hidden cells by default
+            chart.show_hidden_data()
+            chart_rows = min(rows, chart_max_rows)
+            chart.add_series({
+                'name': "Price",
+                'categories': ["Query Results", 1, 1, chart_rows, 1],
+                'values': ["Query Results", 1, 4, chart_rows, 4],
+            })
+            ws.insert_chart("F5", chart)
+    finally:
+        wb.close()
+    logger.info("Excel report saved: %s", output)
+    return output
+
+
+def _results_frame(records):
+    """Typed DataFrame of result records: numeric price_value, currency code and datetime timestamp"""
+    df = pd.DataFrame(records)
+    for column in REPORT_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    if 'price_value' not in df.columns or 'currency' not in df.columns:
+        normalized = normalize_prices(df['price'])
+        df['price_value'] = normalized['price_value'].to_numpy()
+        df['currency'] = normalized['currency'].to_numpy()
+    df['price_value'] = pd.to_numeric(df['price_value'], errors='coerce').astype('float64')
+    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    return df[['site', 'title', 'price', 'price_value', 'currency', 'timestamp']]
+
+
+class ReportExporter(ABC):
+    """Base report writer for one output format, registered in REPORT_EXPORTERS"""
+    extension = None
+    label = None
+
+    @abstractmethod
+    def export(self, data, query, output=None):
+        """Write the report to output (a path or binary file-like object, None for a new file) and return it"""
+
+
+class ChunkedReportExporter(ReportExporter):
+    """Report writer taking records in fixed-size chunks, so any iterable of records works"""
+
+    def __init__(self, chunk_size=10000):
+        self.chunk_size = chunk_size
+
+    def export(self, data, query, output=None):
+        logger.info("Creating %s report for query: %s", self.label, query)
+        if output is None:
+            output = f"query_report_{uuid.uuid4().hex[:8]}.{self.extension}"
+        owns_handle = isinstance(output, (str, os.PathLike))
+        handle = open(output, 'wb') if owns_handle else output
+        records = iter(data)
+        rows = 0
+        try:
+            first = True
+            # Always write at least one (possibly empty) chunk so headers/schemas exist for empty reports
+            while True:
+                chunk = list(itertools.islice(records, self.chunk_size))
+                if not chunk and not first:
+                    break
+                self.write_chunk(_results_frame(chunk), handle, first)
+                rows += len(chunk)
+                first = False
+            self.close(handle)
+        except Exception as e:
+            logger.error("Error creating %s report: %s", self.label, str(e), exc_info=True)
+            raise
+        finally:
+            if owns_handle:
+                handle.close()
+        logger.info("%s report saved: %s (%d rows)", self.label, output, rows)
+        return output
+
+    @abstractmethod
+    def write_chunk(self, df, handle, first):
+        """Write one chunk of typed results; first is True for the first (possibly empty) chunk"""
+
+    def close(self, handle):
+        pass
+
+
+class CsvExporter(ChunkedReportExporter):
+    extension = "csv"
+    label = "CSV"
+
+    def write_chunk(self, df, handle, first):
+        handle.write(df.to_csv(index=False, header=first, date_format='%Y-%m-%d %H:%M:%S').encode('utf-8'))
+
+
+class JsonLinesExporter(ChunkedReportExporter):
+    extension = "jsonl"
+    label = "JSON Lines"
+
+    def write_chunk(self, df, handle, first):
+        if df.empty:
+            return
+        lines = df.to_json(orient='records', lines=True, date_format='iso', force_ascii=False)
+        if not lines.endswith("\n"):
+            lines += "\n"
+        handle.write(lines.encode('utf-8'))
+
+
+class ParquetExporter(ChunkedReportExporter):
+    extension = "parquet"
+    label = "Parquet"
+
+    def __init__(self, chunk_size=10000):
+        super().__init__(chunk_size)
+        self._writer = None
+
+    def write_chunk(self, df, handle, first):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+        schema = pa.schema([
+            ('site', pa.string()), ('title', pa.string()), ('price', pa.string()),
+            ('price_value', pa.float64()), ('currency', pa.string()), ('timestamp', pa.timestamp('us')),
+        ])
+        if first:
+            self._writer = pq.ParquetWriter(handle, schema)
+        self._writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False, safe=False))
+
+    def close(self, handle):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ExcelExporter(ReportExporter):
+    extension = "xlsx"
+    label = "Excel"
+
+    def __init__(self, streaming_report_threshold=50000, **options):
+        self.streaming_report_threshold = streaming_report_threshold
+        self.options = options
+
+    def export(self, data, query, output=None):
+        return build_excel_report(data, query, streaming_report_threshold=self.streaming_report_threshold,
+                                  output=output, **self.options)
+
+
+REPORT_EXPORTERS = {
+    'excel': ExcelExporter,
+    'csv': CsvExporter,
+    'jsonl': JsonLinesExporter,
+    'parquet': ParquetExporter,
+}
+
+
+def prune_report_dir(directory, max_bytes, keep=None, older_than=None):
+    """
+    Delete the oldest reports in directory until their total size fits max_bytes.
+    Reports modified at or after older_than (a time.time() value) are never deleted, so a report that a
+    concurrent query is still writing or has just written survives; the directory can therefore stay over
+    max_bytes until those reports age out on a later prune.
+    Args:
+        directory (str): Report directory
+        max_bytes (int): Size budget for all query_report_* files in directory
+        keep (str): Path that is never deleted (the report just written)
+        older_than (float): Only delete reports last modified before this timestamp
+    """
+    reports = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith("query_report_") and os.path.isfile(path):
+            stat = os.stat(path)
+            reports.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in reports)
+    for mtime, size, path in sorted(reports):
+        if total <= max_bytes:
+            break
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        if older_than is not None and mtime >= older_than:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            logger.debug("Removed old report: %s", path)
+        except OSError as e:
+            logger.warning("Could not remove old report %s: %s", path, str(e))
+
+
+def build_report(data, query, output_format='excel', output=None, output_dir=None, max_output_bytes=None,
+                 **options):
+    """
+    Write a report in the given format.
+    Args:
+        data (iterable): Result records
+        query (str): Query the results belong to
+        output_format (str): 'excel', 'csv', 'jsonl' or 'parquet'
+        output: None to write a file, 'memory' to return the report as bytes, or a binary file-like object
+        output_dir (str): Directory for file output (default: current working directory)
+        max_output_bytes (int): Delete the oldest reports in output_dir once their total size exceeds this
+            (reports newer than this one's start are left alone, see prune_report_dir)
+    Returns:
+        str | bytes | file-like: Report path, report bytes, or the supplied file-like object
+    """
+    exporter_class = REPORT_EXPORTERS.get(output_format)
+    if exporter_class is None:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    exporter = exporter_class(**options)
+    if output == "memory":
+        buffer = io.BytesIO()
+        exporter.export(data, query, buffer)
+        return buffer.getvalue()
+    if output is not None:
+        return exporter.export(data, query, output)
+    directory = output_dir or "."
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    filename = os.path.join(directory, f"query_report_{uuid.uuid4().hex[:8]}.{exporter_class.extension}")
+    if output_dir is None:
+        filename = os.path.basename(filename)
+    started = time.time()
+    exporter.export(data, query, filename)
+    if max_output_bytes is not None:
+        prune_report_dir(directory, max_output_bytes, keep=filename, older_than=started)
+    return filename
+
+
+class MCPCommandRegistry:
+    """Registry of MCP command handlers, each with a timeout and retry policy, recording per-command latency"""
+
+    def __init__(self):
+        self._commands = {}
+        self.stats = {}
+
+    def register(self, name, timeout=30, retries=0, backoff=0.5):
+        """
+        Decorator registering an async handler(page, step) for an MCP command.
+        Args:
+            name (str): Command name used in workflow steps
+            timeout (float): Seconds before an attempt is abandoned (None for no limit)
+            retries (int): Extra attempts after a failure
+            backoff (float): Base delay in seconds between attempts (doubled each retry)
+        """
+        def decorator(handler):
+            self._commands[name] = {'handler': handler, 'timeout': timeout, 'retries': retries, 'backoff': backoff}
+            return handler
+        return decorator
+
+    def copy(self):
+        """Registry with the same commands and fresh timing stats"""
+        registry = MCPCommandRegistry()
+        registry._commands = dict(self._commands)
+        return registry
+
+    def __contains__(self, name):
+        return name in self._commands
+
+    async def execute(self, page, step, site=None, deadline=None):
+        """
+        Run one workflow step; errors are logged (not raised) so the rest of the workflow continues.
+        Args:
+            page (Page): Page the step runs on
+            step (dict): Workflow step with 'command' and its arguments
+            site (str): Site name for log messages
+            deadline (float): Event loop time (loop.time()) by which the step must finish; attempts are cut
+                short and retries skipped so the step never runs past it
+        """
+        name = step.get('command')
+        command = self._commands.get(name)
+        if command is None:
+            logger.warning("Unknown MCP command for %s: %s", site, name)
+            return False
+        logger.debug("Executing step: %s", step)
+        loop = asyncio.get_running_loop()
+        attempts = command['retries'] + 1
+        for attempt in range(attempts):
+            timeout = command['timeout']
+            if deadline is not None:
+                remaining = max(0.0, deadline - loop.time())
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(command['handler'](page, step), timeout=timeout)
+                self._record(name, time.perf_counter() - started, failed=False)
+                return True
+            except Exception as e:
+                self._record(name, time.perf_counter() - started, failed=True)
+                # With timeout=None a TimeoutError comes from the handler itself, so its own message is kept
+                if isinstance(e, asyncio.TimeoutError) and timeout is not None:
+                    e = f"timed out after {timeout:g} seconds"
+                delay = command['backoff'] * 2 ** attempt
+                if attempt < attempts - 1 and (deadline is None or loop.time() + delay < deadline):
+                    logger.warning("MCP step %s for %s failed (attempt %d/%d): %s", name, site, attempt + 1, attempts, e)
+                    await asyncio.sleep(delay)
+                else:
+                    logger.error("Error in MCP step %s for %s: %s", name, site, e, exc_info=True)
+                    break
+        return False
+
+    def _record(self, name, elapsed, failed):
+        stats = self.stats.setdefault(name, {'calls': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+        stats['calls'] += 1
+        stats['errors'] += int(failed)
+        stats['total_seconds'] += elapsed
+        stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+
+    def timing_summary(self):
+        """Per-command call counts and latencies, slowest total time first"""
+        summary = []
+        for name, stats in self.stats.items():
+            summary.append({
+                'command': name,
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'total_seconds': round(stats['total_seconds'], 4),
+                'mean_seconds': round(stats['total_seconds'] / stats['calls'], 4),
+                'max_seconds': round(stats['max_seconds'], 4),
+            })
+        return sorted(summary, key=lambda row: row['total_seconds'], reverse=True)
+
+
+MCP_COMMANDS = MCPCommandRegistry()
+
+
+@MCP_COMMANDS.register("browser_navigate", timeout=25, retries=1)
+async def browser_navigate(page, step):
+    await page.goto(step['value'], wait_until='domcontentloaded')
+    logger.debug("Navigated to %s", step['value'])
+
+
+@MCP_COMMANDS.register("browser_scroll", timeout=10)
+async def browser_scroll(page, step):
+    await page.evaluate("(pixels) => window.scrollBy(0, pixels)", step['value'])
+    logger.debug("Scrolled by %d pixels", step['value'])
+
+
+@MCP_COMMANDS.register("browser_wait", timeout=None)
+async def browser_wait(page, step):
+    await page.wait_for_timeout(step['value'] * 1000)
+    logger.debug("Waited for %d seconds", step['value'])
+
+
+@MCP_COMMANDS.register("browser_wait_for_selector_count", timeout=60)
+async def browser_wait_for_selector_count(page, step):
+    try:
+        await page.wait_for_function(
+            "([selector, count]) => document.querySelectorAll(selector).length >= count",
+            arg=[step['selector'], step['value']],
+            timeout=step.get('timeout', 10) * 1000
+        )
+        logger.debug("Found at least %d elements for selector '%s'", step['value'], step['selector'])
+    except PlaywrightTimeoutError:
+        logger.debug("Fewer than %d elements for selector '%s' after %s seconds, continuing",
+                     step['value'], step['selector'], step.get('timeout', 10))
+
+
+@MCP_COMMANDS.register("browser_wait_for_network_idle", timeout=60)
+async def browser_wait_for_network_idle(page, step):
+    try:
+        await page.wait_for_load_state('networkidle', timeout=step['value'] * 1000)
+        logger.debug("Network idle reached")
+    except PlaywrightTimeoutError:
+        logger.debug("Network not idle after %s seconds, continuing", step['value'])
+
+
+@MCP_COMMANDS.register("browser_wait_for_function", timeout=60)
+async def browser_wait_for_function(page, step):
+    try:
+        await page.wait_for_function(step['value'], timeout=step.get('timeout', 10) * 1000)
+        logger.debug("Condition met: %s", step['value'])
+    except PlaywrightTimeoutError:
+        logger.debug("Condition not met after %s seconds, continuing: %s", step.get('timeout', 10), step['value'])
+
+
+@MCP_COMMANDS.register("browser_type", timeout=15)
+async def browser_type(page, step):
+    await page.fill(step['selector'], step['value'])
+    logger.debug("Typed '%s' into selector '%s'", step['value'], step['selector'])
+
+
+@MCP_COMMANDS.register("browser_press", timeout=15)
+async def browser_press(page, step):
+    await page.keyboard.press(step['value'])
+    logger.debug("Pressed key: %s", step['value'])
+
+
+@MCP_COMMANDS.register("browser_click", timeout=15, retries=1)
+async def browser_click(page, step):
+    await page.click(step['selector'])
+    logger.debug("Clicked selector '%s'", step['selector'])
+
+
+class FakeLLMClient:
+    def __init__(self, supported_sites, responses=None, replay_file=None, strict=False, latency=0.05, jitter=0.0,
+                 error_rate=0.0, seed=None):
+        """
+        Offline stand-in for an LLM provider, returning canned or recorded parse results.
+        Args:
+            supported_sites (iterable): Site names used for synthesized results
+            responses (dict): Query -> parsed result (matched on the normalized query)
+            replay_file (str): JSON Lines file of {"query": ..., "result": ...} records (see record_file)
+            strict (bool): Fail for queries without a canned/recorded result instead of synthesizing one
+            latency (float): Simulated seconds per request
+            jitter (float): Extra random seconds per request (uniform 0..jitter)
+            error_rate (float): Probability (0-1) that a request fails
+            seed (int): Seed for jitter and errors, for reproducible runs
+        """
+        self.responses = {}
+        if replay_file:
+            with open(replay_file, encoding="utf-8") as handle:
+                for line in handle:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.responses[ParseCache.normalize(record["query"])] = record["result"]
+        for query, result in (responses or {}).items():
+            self.responses[ParseCache.normalize(query)] = result
+        self.supported_sites = list(supported_sites)
+        self.strict = strict
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._rules = RuleBasedQueryParser(self.supported_sites)
+
+    def parse(self, query):
+        result = self.responses.get(ParseCache.normalize(query))
+        if result is None:
+            if self.strict:
+                raise ValueError(f"No recorded parse for query: {query}")
+            result, _ = self._rules.parse(query)
+        if result is None:
+            result = {
+                "query_type": "product_search",
+                "target_websites": list(self.supported_sites),
+                "search_params": {"category": query, "budget": None, "specific_product": None},
+            }
+        return json.loads(json.dumps(result))
+
+    async def complete(self, queries, batch=False):
+        """Simulate one provider request for the given queries"""
+        self.requests += 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise RuntimeError("Simulated LLM provider error")
+        if batch:
+            return {"results": [dict(self.parse(query), index=index) for index, query in enumerate(queries)]}
+        return self.parse(queries[0])
+
+
+async def handle_dialog(dialog):
+    """Accept any JavaScript dialog so it does not block the page"""
+    logger.info("Dialog detected: %s", dialog.message)
+    await dialog.accept()
+
+
+class BrowserPool:
+    def __init__(self, size=1, headless=True, max_contexts_per_browser=100, launch_options=None):
+        """
+        Long-lived pool of Chromium browsers handing out isolated contexts.
+        Args:
+            size (int): Number of browser processes kept running
+            headless (bool): Launch browsers in headless mode
+            max_contexts_per_browser (int): Contexts served before an idle browser is relaunched
+            launch_options (dict): Extra keyword arguments for chromium.launch
+        """
+        self.size = max(1, size)
+        self.headless = headless
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.launch_options = launch_options or {}
+        self._playwright = None
+        self._browsers = []
+        self._uses = []
+        self._next_slot = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self):
+        return self._playwright is not None
+
+    async def start(self):
+        """Start Playwright and launch the pooled browsers"""
+        if self.started:
+            return
+        logger.info("Starting browser pool with %d browser(s)", self.size)
+        self._playwright = await async_playwright().start()
+        self._browsers = [None] * self.size
+        self._uses = [0] * self.size
+        try:
+            for slot in range(self.size):
+                await self._launch(slot)
+        except Exception as e:
+            logger.error("Error starting browser pool: %s", str(e), exc_info=True)
+            await self.stop()
+            raise
+
+    async def stop(self):
+        """Close all pooled browsers and stop Playwright"""
+        if not self.started:
+            return
+        for slot, browser in enumerate(self._browsers):
+            if browser is None:
+                continue
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning("Error closing browser in slot %d: %s", slot, str(e))
+        self._browsers = []
+        self._uses = []
+        try:
+            await self._playwright.stop()
+        finally:
+            self._playwright = None
+        logger.info("Browser pool stopped")
+
+    async def _launch(self, slot):
+        browser = await self._playwright.chromium.launch(headless=self.headless, **self.launch_options)
+        self._browsers[slot] = browser
+        self._uses[slot] = 0
+        logger.debug("Launched browser in slot %d", slot)
+        return browser
+
+    async def _checkout(self):
+        """Pick the next browser round-robin, restarting it if it crashed or is due for recycling"""
+        async with self._lock:
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.size
+            browser = self._browsers[slot]
+            if browser is None or not browser.is_connected():
+                logger.warning("Browser in slot %d is not connected, relaunching", slot)
+                browser = await self._launch(slot)
+            elif self._uses[slot] >= self.max_contexts_per_browser and not browser.contexts:
+                logger.info("Recycling browser in slot %d after %d contexts", slot, self._uses[slot])
+                try:
+                    await browser.close()
+                except Exception as e:
+                    logger.warning("Error closing browser in slot %d: %s", slot, str(e))
+                browser = await self._launch(slot)
+            self._uses[slot] += 1
+            return browser
+
+    @asynccontextmanager
+    async def page(self, **context_options):
+        """Yield a fresh page in its own browser context; the context is closed on exit"""
+        if not self.started:
+            raise RuntimeError("Browser pool is not started")
+        browser = await self._checkout()
+        context = await browser.new_context(**context_options)
+        try:
+            page = await context.new_page()
+            page.on("dialog", handle_dialog)
+            yield page
+        finally:
+            try:
+                await context.close()
+            except Exception as e:
+                logger.warning("Error closing browser context: %s", str(e))
+
 
 class QueryProcessor:
-    def __init__(self, llm_provider="groq", groq_api_key=None, openai_api_key=None, ollama_model="gemma3:1b"):
+    def __init__(self, llm_provider="groq", groq_api_key=None, openai_api_key=None, ollama_model="gemma3:1b",
+                 browser_pool=None, site_concurrency=4, site_timeout=60, item_limit=5, batch_extraction=True,
+                 blocking_profiles=None, parse_cache=None, fast_path=True, fast_path_threshold=0.8,
+                 streaming_report_threshold=50000, report_executor="thread", report_workers=None,
+                 output_format="excel", output_dir=None, max_output_bytes=None, mcp_commands=None, latency=None,
+                 supported_sites=None, fake_llm=None, replay_file=None, record_file=None):
         """
         Initialize QueryProcessor with specified LLM provider.
         Args:
-            llm_provider (str): 'groq', 'openai', or 'ollama'
+            llm_provider (str): 'groq', 'openai', 'ollama', or 'fake'/'replay' for offline runs
             groq_api_key (str): Groq API key (optional if set in env)
             openai_api_key (str): OpenAI API key (optional if set in env)
             ollama_model (str): Ollama model name (default: 'llama3')
+            browser_pool (BrowserPool): Shared browser pool (a single-browser pool is created if omitted)
+            site_concurrency (int): Maximum number of sites scraped at the same time
+            site_timeout (float): Seconds allowed per site before its results are dropped
+            item_limit (int): Maximum number of items scraped per site
+            batch_extraction (bool): Extract all items in one page.evaluate call instead of per element
+            blocking_profiles (dict): Request blocking profile per site, 'default' applies to other sites ({} disables)
+            parse_cache (ParseCache): Cache of parsed queries consulted before calling the LLM (optional)
+            fast_path (bool): Try the rule-based parser before the LLM
+            fast_path_threshold (float): Minimum rule-based confidence (0-1) to skip the LLM
+            streaming_report_threshold (int): Row count from which reports use the constant-memory writer
+            report_executor: 'thread', 'process', a concurrent.futures.Executor, or None to build reports inline
+            report_workers (int): Worker count for the thread/process report pool (executor default if None)
+            output_format (str): Default report format: 'excel', 'csv', 'jsonl' or 'parquet'
+            output_dir (str): Directory for report files (default: current working directory)
+            max_output_bytes (int): Size bound for output_dir; the oldest reports are deleted beyond it
+            mcp_commands (MCPCommandRegistry): Command handlers for workflow steps (copy of MCP_COMMANDS if omitted)
+            latency (LatencyRecorder): Recorder for per-query stage spans (an in-memory one is created if omitted)
+            supported_sites (dict): Site name -> base URL (e.g. FakeSiteServer.supported_sites() for offline runs)
+            fake_llm (FakeLLMClient): Client for the 'fake'/'replay' providers (created with defaults if omitted)
+            replay_file (str): Recorded parses served by the 'replay' provider
+            record_file (str): Append every LLM parse to this JSON Lines file, for later replay
         """
-        self.supported_sites = {
+        self.supported_sites = supported_sites or {
             'amazon': 'https://www.amazon.com',
             'flipkart': 'https://www.flipkart.com',
         }
+        # Declarative extraction spec per site: item container plus a selector per field
+        self.extraction_specs = {
+            'amazon': {
+                'label': 'Amazon',
+                'item_selector': '.s-result-item',
+                'fields': {'title': 'h2', 'price': '.a-price .a-offscreen'},
+            },
+            'flipkart': {
+                'label': 'Flipkart',
+                'item_selector': 'div._1AtVbE',
+                'wait_for': 'div._1AtVbE',
+                'fields': {'title': 'a.s1Q9rs', 'price': 'div._30jeq3'},
+            },
+        }
+        self.item_limit = item_limit
+        if blocking_profiles is None:
+            blocking_profiles = {'default': DEFAULT_BLOCKING_PROFILE}
+        self.blocking_profiles = blocking_profiles
+        self.batch_extraction = batch_extraction
+        self.browser_pool = browser_pool or BrowserPool()
+        self.mcp_commands = mcp_commands or MCP_COMMANDS.copy()
+        self.latency = latency or LatencyRecorder()
+        self._pool_lock = asyncio.Lock()
+        self._pool_users = 0
+        self._implicit_pool = False
+        self.parse_cache = parse_cache
+        self.record_file = record_file
+        self.streaming_report_threshold = streaming_report_threshold
+        self.report_executor = report_executor
+        self.report_workers = report_workers
+        self._report_pool = None
+        if output_format not in REPORT_EXPORTERS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        self.output_format = output_format
+        self.output_dir = output_dir
+        self.max_output_bytes = max_output_bytes
+        # Identical concurrent queries and site scrapes are performed once and shared
+        self._query_flight = SingleFlight()
+        self._site_flight = SingleFlight()
+        # Request blocking counters over every site actually scraped (coalesced scrapes count once)
+        self.blocking_stats = {'allowed_requests': 0, 'blocked_requests': 0, 'estimated_bytes_saved': 0}
+        self.fast_path_parser = RuleBasedQueryParser(self.supported_sites) if fast_path else None
+        self.fast_path_threshold = fast_path_threshold
+        self.site_concurrency = max(1, site_concurrency)
+        self.site_timeout = site_timeout
         self.llm_provider = llm_provider.lower()
         
         # Initialize LLM client based on provider
@@ -54,7 +1448,7 @@ class QueryProcessor:
             if not self.api_key:
                 logger.error("No Groq API key provided")
                 raise ValueError("Groq API key is required")
-            self.client = Groq(api_key=self.api_key)
+            self.client = AsyncGroq(api_key=self.api_key)
             self.model = "mixtral-8x7b-32768"
             logger.info("Initialized Groq client with API key ending in: %s", self.api_key[-4:])
         elif self.llm_provider == "openai":
@@ -67,7 +1461,7 @@ class QueryProcessor:
             logger.info("Initialized OpenAI client with API key ending in: %s", self.api_key[-4:])
         elif self.llm_provider == "ollama":
             self.model = ollama_model
-            self.client = ollama
+            self.client = ollama.AsyncClient()
             logger.info("Initialized Ollama client with model: %s", self.model)
             # Verify Ollama server is running
             try:
@@ -75,14 +1469,109 @@ class QueryProcessor:
             except Exception as e:
                 logger.error("Ollama server not running or model %s not available: %s", self.model, str(e))
                 raise ValueError(f"Ollama server not running or model {self.model} not available")
+        elif self.llm_provider in ("fake", "replay"):
+            if self.llm_provider == "replay" and fake_llm is None and not replay_file:
+                logger.error("No replay file provided")
+                raise ValueError("Replay provider requires replay_file or fake_llm")
+            self.client = fake_llm or FakeLLMClient(self.supported_sites, replay_file=replay_file,
+                                                    strict=self.llm_provider == "replay")
+            self.model = self.llm_provider
+            logger.info("Initialized %s LLM client with %d canned response(s)", self.llm_provider,
+                        len(self.client.responses))
         else:
             logger.error("Unsupported LLM provider: %s", self.llm_provider)
             raise ValueError(f"Unsupported LLM provider: {self.llm_provider}")
         
         logger.info("QueryProcessor initialized with provider: %s, supported sites: %s", self.llm_provider, self.supported_sites)
 
+    async def start(self):
+        """Start the browser pool so queries reuse running browsers"""
+        async with self._pool_lock:
+            await self.browser_pool.start()
+            self._implicit_pool = False
+
+    async def stop(self):
+        """Stop the browser pool and the report worker pool"""
+        await self.browser_pool.stop()
+        self.latency.flush()
+        pool, self._report_pool = self._report_pool, None
+        if pool is not None and pool is not self.report_executor:
+            # Waiting for in-flight reports happens off the event loop
+            await asyncio.to_thread(pool.shutdown)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def _cache_key(self, query):
+        # Parses differ between models, so the provider and model are part of the key
+        return f"{self.llm_provider}:{self.model}:{ParseCache.normalize(query)}"
+
+    def _parse_locally(self, query):
+        """Resolve a query from the parse cache or the rule-based fast path; None means the LLM is needed"""
+        if self.parse_cache is not None:
+            cached = self.parse_cache.get(self._cache_key(query))
+            if cached is not None:
+                logger.info("Parse cache hit for query: %s", query)
+                return cached
+        if self.fast_path_parser is not None:
+            self.fast_path_parser.attempts += 1
+            parsed_result, confidence = self.fast_path_parser.parse(query)
+            if parsed_result is not None and confidence >= self.fast_path_threshold:
+                self.fast_path_parser.accepted += 1
+                logger.info("Query parsed by fast path (confidence %.2f): %s", confidence, parsed_result)
+                return parsed_result
+            logger.debug("Fast path confidence %.2f below threshold, using LLM", confidence)
+        return None
+
+    def _remember_parse(self, query, parsed_result):
+        if self.parse_cache is not None:
+            self.parse_cache.set(self._cache_key(query), parsed_result)
+        if self.record_file:
+            with open(self.record_file, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps({"query": query, "result": parsed_result}, ensure_ascii=False) + "\n")
+
+    async def _complete_json(self, prompt, queries, batch=False):
+        """Send a prompt to the configured LLM provider and return its JSON response as a dict"""
+        if self.llm_provider in ("fake", "replay"):
+            return await self.client.complete(queries, batch)
+        # All providers use async clients so LLM latency never blocks the event loop
+        if self.llm_provider in ("groq", "openai"):
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"}
+            )
+            return json.loads(response.choices[0].message.content)
+        elif self.llm_provider == "ollama":
+            response = await self.client.chat(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                options={"format": "json"}  # Enforce JSON output
+            )
+            content = response.get("message", {}).get("content", "")
+            if not content:
+                logger.warning("Empty response from Ollama")
+                raise ValueError("Empty response from Ollama")
+            try:
+                return json.loads(content)
+            except json.JSONDecodeError as e:
+                logger.error("Invalid JSON from Ollama: %s", content)
+                raise ValueError(f"Invalid JSON from Ollama: {str(e)}")
+        raise ValueError(f"Unsupported LLM provider: {self.llm_provider}")
+
+    @traced("parse")
     async def parse_query(self, query):
         """Parse natural language query using the specified LLM provider"""
+        parsed_result = self._parse_locally(query)
+        if parsed_result is not None:
+            return parsed_result
+        return await self._parse_with_llm(query)
+
+    async def _parse_with_llm(self, query):
         logger.info("Parsing query with %s: %s", self.llm_provider, query)
         retries = 3
         for attempt in range(retries):
@@ -101,38 +1590,9 @@ class QueryProcessor:
                     "search_params": {{"category": "trimmers", "budget": "₹1000", "specific_product": null}}
                 }}
                 """
-                
-                if self.llm_provider == "groq":
-                    response = self.client.chat.completions.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        response_format={"type": "json_object"}
-                    )
-                    parsed_result = json.loads(response.choices[0].message.content)
-                elif self.llm_provider == "openai":
-                    response = await self.client.chat.completions.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        response_format={"type": "json_object"}
-                    )
-                    parsed_result = json.loads(response.choices[0].message.content)
-                elif self.llm_provider == "ollama":
-                    response = ollama.chat(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        options={"format": "json"}  # Enforce JSON output
-                    )
-                    content = response.get("message", {}).get("content", "")
-                    if not content:
-                        logger.warning("Empty response from Ollama for query: %s", query)
-                        raise ValueError("Empty response from Ollama")
-                    try:
-                        parsed_result = json.loads(content)
-                    except json.JSONDecodeError as e:
-                        logger.error("Invalid JSON from Ollama: %s", content)
-                        raise ValueError(f"Invalid JSON from Ollama: {str(e)}")
-                
+                parsed_result = await self._complete_json(prompt, [query])
                 logger.info("Query parsed successfully: %s", parsed_result)
+                self._remember_parse(query, parsed_result)
                 return parsed_result
             except Exception as e:
                 logger.error("Attempt %d/%d failed for query '%s' with %s: %s", 
@@ -144,6 +1604,105 @@ class QueryProcessor:
         logger.error("All attempts to parse query '%s' failed", query)
         raise Exception("Failed to parse query after retries")
 
+    async def parse_queries(self, queries, batch_size=20, concurrency=4):
+        """
+        Parse many queries, packing the ones that need the LLM into multi-query requests.
+        Args:
+            queries (list): Natural language queries
+            batch_size (int): Maximum number of queries per LLM request
+            concurrency (int): Maximum number of batch requests in flight
+        Returns:
+            list: One parsed result per query, in input order (None where parsing failed)
+        """
+        results = [None] * len(queries)
+        pending = []
+        for index, query in enumerate(queries):
+            parsed_result = self._parse_locally(query)
+            if parsed_result is not None:
+                results[index] = parsed_result
+            else:
+                pending.append(index)
+        logger.info("Batch parsing %d queries: %d resolved locally, %d sent to %s",
+                    len(queries), len(queries) - len(pending), len(pending), self.llm_provider)
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        batch_size = max(1, batch_size)
+
+        async def run_batch(indices):
+            async with semaphore:
+                await self._parse_batch(queries, indices, results)
+
+        await asyncio.gather(*(run_batch(pending[i:i + batch_size]) for i in range(0, len(pending), batch_size)))
+        return results
+
+    async def _parse_batch(self, queries, indices, results):
+        """Parse several queries in one LLM request, retrying only the items that came back invalid"""
+        if len(indices) == 1:
+            index = indices[0]
+            try:
+                results[index] = await self._parse_with_llm(queries[index])
+            except Exception as e:
+                logger.error("Failed to parse query '%s' in batch: %s", queries[index], str(e))
+            return
+
+        numbered = "\n".join(f"{position}: {json.dumps(queries[index], ensure_ascii=False)}"
+                             for position, index in enumerate(indices))
+        prompt = f"""
+        Analyze each of these numbered user queries:
+        {numbered}
+        Return a JSON object {{"results": [...]}} with exactly one entry per query, each with:
+        - index (the query number)
+        - query_type (product_search, price_comparison, flight_search)
+        - target_websites (list of sites)
+        - search_params (dict with category, budget, specific_product, etc.)
+        Example entry:
+        {{"index": 0, "query_type": "product_search", "target_websites": ["amazon", "flipkart"],
+          "search_params": {{"category": "trimmers", "budget": "₹1000", "specific_product": null}}}}
+        """
+        # Provider errors retry the same batch; only items that come back missing or invalid are split off
+        entries = None
+        retries = 3
+        for attempt in range(retries):
+            try:
+                response = await self._complete_json(prompt, [queries[index] for index in indices], batch=True)
+                entries = response.get("results", []) if isinstance(response, dict) else []
+                break
+            except Exception as e:
+                logger.error("Attempt %d/%d failed for batch of %d queries with %s: %s",
+                             attempt + 1, retries, len(indices), self.llm_provider, str(e))
+                if attempt < retries - 1:
+                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
+        if entries is None:
+            logger.error("Giving up on batch of %d queries after %d failed requests", len(indices), retries)
+            return
+
+        by_position = {}
+        for entry in entries:
+            if isinstance(entry, dict) and isinstance(entry.get("index"), int):
+                by_position[entry["index"]] = entry
+        failed = []
+        for position, index in enumerate(indices):
+            entry = by_position.get(position)
+            if (entry is None or not isinstance(entry.get("target_websites"), list)
+                    or not isinstance(entry.get("search_params"), dict)):
+                failed.append(index)
+                continue
+            parsed_result = {key: value for key, value in entry.items() if key != "index"}
+            results[index] = parsed_result
+            self._remember_parse(queries[index], parsed_result)
+        logger.info("Batch parsed %d/%d queries", len(indices) - len(failed), len(indices))
+
+        if not failed:
+            return
+        if len(failed) == len(indices):
+            # The whole batch failed: split it so one bad query cannot sink the others
+            middle = len(indices) // 2
+            await self._parse_batch(queries, indices[:middle], results)
+            await self._parse_batch(queries, indices[middle:], results)
+        else:
+            await self._parse_batch(queries, failed, results)
+
+    @traced("workflow")
     async def generate_mcp_workflow(self, parsed_query):
         """Generate MCP browser automation steps based on parsed query"""
         logger.info("Generating MCP workflow for parsed query: %s", parsed_query)
@@ -159,8 +1718,14 @@ class QueryProcessor:
                     steps = [
                         {"command": "browser_navigate", "value": f"{self.supported_sites[site.lower()]}/s?k={search_term}"},
                         {"command": "browser_scroll", "value": 2000},
-                        {"command": "browser_wait", "value": 2},
                     ]
+                    # Wait for the results to render rather than a fixed sleep; the cap keeps the old 2 s worst case
+                    spec = self.extraction_specs.get(site.lower())
+                    if spec:
+                        steps.append({"command": "browser_wait_for_selector_count", "selector": spec['item_selector'],
+                                      "value": self.item_limit, "timeout": 2})
+                    else:
+                        steps.append({"command": "browser_wait_for_network_idle", "value": 2})
                     if budget and site.lower() == 'flipkart':
                         steps.append({"command": "browser_type", "selector": "input[name='q']", "value": f"{search_term} under {budget}"})
                         steps.append({"command": "browser_press", "value": "Enter"})
@@ -174,167 +1739,304 @@ class QueryProcessor:
             logger.error("Error generating MCP workflow: %s", str(e), exc_info=True)
             raise
 
-    async def scrape_site(self, page, site, steps):
-        """Execute MCP workflow and scrape data"""
+    async def _extract_batch(self, page, spec):
+        """Extract all item fields with a single page.evaluate round trip"""
+        extracted = await page.evaluate(BATCH_EXTRACT_JS, [spec['item_selector'], spec['fields'], self.item_limit])
+        logger.info("Found %d items on %s", extracted['count'], spec['label'])
+        return extracted['items']
+
+    async def _extract_elements(self, page, spec):
+        """Extract item fields element by element (one round trip per field)"""
+        items = await page.query_selector_all(spec['item_selector'])
+        logger.info("Found %d items on %s", len(items), spec['label'])
+        rows = []
+        for item in items[:self.item_limit]:
+            row = {}
+            for field, selector in spec['fields'].items():
+                elem = await item.query_selector(selector)
+                row[field] = await elem.inner_text() if elem else None
+            rows.append(row)
+        return rows
+
+    async def scrape_site(self, page, site, steps, deadline=None):
+        """Execute MCP workflow and scrape data; deadline (loop.time()) bounds the steps' timeouts and retries"""
         logger.info("Scraping site: %s", site)
         results = []
         
+        # Per-query step spans nest under query/scrape/site; the registry keeps the process-wide per-command totals
         for step in steps:
-            try:
-                logger.debug("Executing step: %s", step)
-                if step['command'] == 'browser_navigate':
-                    await page.goto(step['value'], wait_until='domcontentloaded')
-                    logger.debug("Navigated to %s", step['value'])
-                elif step['command'] == 'browser_scroll':
-                    await page.evaluate(f"window.scrollBy(0, {step['value']})")
-                    logger.debug("Scrolled by %d pixels", step['value'])
-                elif step['command'] == 'browser_wait':
-                    await page.wait_for_timeout(step['value'] * 1000)
-                    logger.debug("Waited for %d seconds", step['value'])
-                elif step['command'] == 'browser_type':
-                    await page.fill(step['selector'], step['value'])
-                    logger.debug("Typed '%s' into selector '%s'", step['value'], step['selector'])
-                elif step['command'] == 'browser_press':
-                    await page.keyboard.press(step['value'])
-                    logger.debug("Pressed key: %s", step['value'])
-            except Exception as e:
-                logger.error("Error in MCP step for %s: %s", site, str(e), exc_info=True)
+            with self.latency.span("step", command=step.get('command')):
+                await self.mcp_commands.execute(page, step, site, deadline=deadline)
 
         # Site-specific scraping logic
-        if site.lower() == 'amazon':
-            try:
-                items = await page.query_selector_all('.s-result-item')
-                logger.info("Found %d items on Amazon", len(items))
-                for item in items[:5]:
-                    title_elem = await item.query_selector('h2')
-                    price_elem = await item.query_selector('.a-price .a-offscreen')
-                    title = await title_elem.inner_text() if title_elem else "N/A"
-                    price = await price_elem.inner_text() if price_elem else "N/A"
-                    results.append({
-                        'site': 'Amazon',
-                        'title': title.strip(),
-                        'price': price.strip(),
-                        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    })
-                    logger.debug("Scraped item: %s, %s", title, price)
-            except Exception as e:
-                logger.error("Scraping error on Amazon: %s", str(e), exc_info=True)
-        
-        elif site.lower() == 'flipkart':
+        spec = self.extraction_specs.get(site.lower())
+        if spec is None:
+            logger.warning("No extraction spec for site: %s", site)
+        else:
             try:
-                await page.wait_for_selector('div._1AtVbE', timeout=10000)
-                items = await page.query_selector_all('div._1AtVbE')
-                logger.info("Found %d items on Flipkart", len(items))
-                for item in items[:5]:
-                    title_elem = await item.query_selector('a.s1Q9rs')
-                    price_elem = await item.query_selector('div._30jeq3')
-                    title = await title_elem.inner_text() if title_elem else "N/A"
-                    price = await price_elem.inner_text() if price_elem else "N/A"
+                if spec.get('wait_for'):
+                    await page.wait_for_selector(spec['wait_for'], timeout=10000)
+                with self.latency.span("extract"):
+                    if self.batch_extraction:
+                        rows = await self._extract_batch(page, spec)
+                    else:
+                        rows = await self._extract_elements(page, spec)
+                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                for row in rows:
+                    title = row.get('title') or "N/A"
+                    price = row.get('price') or "N/A"
                     results.append({
-                        'site': 'Flipkart',
+                        'site': spec['label'],
                         'title': title.strip(),
                         'price': price.strip(),
-                        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                        'timestamp': timestamp
                     })
                     logger.debug("Scraped item: %s, %s", title, price)
+                add_price_columns(results)
             except Exception as e:
-                logger.error("Scraping error on Flipkart: %s", str(e), exc_info=True)
+                logger.error("Scraping error on %s: %s", spec['label'], str(e), exc_info=True)
 
         logger.info("Scraped %d items from %s", len(results), site)
         return results
 
-    def create_excel_report(self, data, query):
+    @traced("scrape")
+    async def scrape_workflow(self, workflow, stats=None):
+        """
+        Scrape every site of a workflow concurrently, each in its own browser context.
+        Args:
+            workflow (list): Site workflows from generate_mcp_workflow
+            stats (dict): Filled with this workflow's request blocking counters (optional)
+        """
+        semaphore = asyncio.Semaphore(self.site_concurrency)
+
+        async def scrape_one(site_workflow):
+            # Returns (results, blocking counters) so callers joining a coalesced scrape see its counters too
+            site = site_workflow['site']
+            blocker = None
+            results = []
+            async with semaphore:
+                with self.latency.span("site", site=site) as span_attributes:
+                    try:
+                        async with self.browser_pool.page() as page:
+                            profile = self.blocking_profiles.get(site.lower(), self.blocking_profiles.get('default'))
+                            if profile:
+                                blocker = ResourceBlocker(profile)
+                                await page.route("**/*", blocker.handle)
+                            # Steps see the site deadline, so retries never outlast site_timeout
+                            deadline = asyncio.get_running_loop().time() + self.site_timeout
+                            results = await asyncio.wait_for(
+                                self.scrape_site(page, site, site_workflow['steps'], deadline=deadline),
+                                timeout=self.site_timeout
+                            )
+                    except asyncio.TimeoutError:
+                        logger.error("Scraping %s timed out after %s seconds", site, self.site_timeout)
+                    except Exception as e:
+                        logger.error("Scraping failed for %s: %s", site, str(e), exc_info=True)
+                    site_stats = blocker.stats if blocker else {key: 0 for key in self.blocking_stats}
+                    span_attributes.update(site_stats)
+            for key, value in site_stats.items():
+                self.blocking_stats[key] += value
+            return results, site_stats
+
+        async def run_site(site_workflow):
+            key = (site_workflow['site'].lower(), json.dumps(site_workflow['steps'], sort_keys=True))
+            return await self._site_flight.do(key, lambda: scrape_one(site_workflow))
+
+        # gather preserves workflow order, so the merged results are deterministic
+        site_results = await asyncio.gather(*(run_site(site_workflow) for site_workflow in workflow))
+        all_results = []
+        totals = {key: 0 for key in self.blocking_stats}
+        for results, site_stats in site_results:
+            all_results.extend(results)
+            for key, value in site_stats.items():
+                totals[key] += value
+        logger.info("Scraped %d items from %d site(s)", len(all_results), len(workflow))
+        if totals['blocked_requests']:
+            logger.info("Blocked %d of %d requests, ~%.1f KB saved", totals['blocked_requests'],
+                        totals['blocked_requests'] + totals['allowed_requests'],
+                        totals['estimated_bytes_saved'] / 1024)
+        if stats is not None:
+            stats.update(totals)
+        return all_results
+
+    def create_excel_report(self, data, query, streaming=None, output=None):
         """Generate Excel report with data, charts, and conditional formatting"""
-        logger.info("Creating Excel report for query: %s", query)
+        return build_report(data, query, 'excel', output=output, output_dir=self.output_dir,
+                            max_output_bytes=self.max_output_bytes, streaming=streaming,
+                            **self._report_options('excel'))
+
+    def _report_options(self, output_format):
+        if output_format == 'excel':
+            return {'streaming_report_threshold': self.streaming_report_threshold}
+        return {}
+
+    @traced("report")
+    async def generate_report(self, data, query, output_format=None, output=None):
+        """
+        Build the report in the report worker pool so the event loop stays responsive.
+        Returns the report path, or bytes when output='memory' (see build_report). A caller-supplied
+        file-like output cannot cross process boundaries, so it is written on a thread instead.
+        """
+        output_format = output_format or self.output_format
+        build = functools.partial(build_report, data, query, output_format, output=output, output_dir=self.output_dir,
+                                  max_output_bytes=self.max_output_bytes, **self._report_options(output_format))
+        if output not in (None, "memory") and self.report_executor == "process":
+            return await asyncio.to_thread(build)
+        if self.report_executor is None:
+            return build()
+        if self._report_pool is None:
+            if self.report_executor == "process":
+                # spawn: forking a process that runs an event loop and browser threads is unsafe
+                self._report_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.report_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            elif self.report_executor == "thread":
+                self._report_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.report_workers,
+                                                                          thread_name_prefix="report")
+            else:
+                self._report_pool = self.report_executor
+        loop = asyncio.get_running_loop()
+        # build_report is a module-level function so it can be pickled for process pools
+        return await loop.run_in_executor(self._report_pool, build)
+
+    @asynccontextmanager
+    async def _browser_session(self):
+        """
+        Keep the browser pool running while a query (or batch) needs it.
+        A pool that was not started explicitly is started on demand and stopped when its last user
+        finishes, so concurrent queries never tear down each other's browsers.
+        """
+        async with self._pool_lock:
+            if not self.browser_pool.started:
+                await self.browser_pool.start()
+                self._implicit_pool = True
+            self._pool_users += 1
         try:
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Query Results"
-
-            # Headers
-            headers = ['Site', 'Product Title', 'Price', 'Timestamp']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col)
-                cell.value = header
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal='center')
-                cell.fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-            logger.debug("Excel headers set: %s", headers)
-
-            # Data
-            df = pd.DataFrame(data)
-            for row, record in enumerate(data, 2):
-                ws.cell(row=row, column=1).value = record['site']
-                ws.cell(row=row, column=2).value = record['title']
-                ws.cell(row=row, column=3).value = record['price']
-                ws.cell(row=row, column=4).value = record['timestamp']
-            logger.debug("Wrote %d rows to Excel", len(data))
+            yield
+        finally:
+            async with self._pool_lock:
+                self._pool_users -= 1
+                if self._implicit_pool and self._pool_users == 0:
+                    self._implicit_pool = False
+                    await self.browser_pool.stop()
 
-            # Conditional formatting: Highlight prices below average
-            if not df.empty:
-                prices = []
-                for price in df['price']:
-                    try:
-                        numeric = float(re.sub(r'[^\d.]', '', price))
-                        prices.append(numeric)
-                    except:
-                        prices.append(0)
-                
-                avg_price = sum(prices) / len(prices) if prices else 0
-                logger.debug("Average price calculated: %s", avg_price)
-                for row in range(2, len(data) + 2):
-                    price_cell = ws.cell(row=row, column=3)
-                    try:
-                        price_value = float(re.sub(r'[^\d.]', '', price_cell.value or '0'))
-                        if price_value < avg_price:
-                            price_cell.fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
-                    except:
-                        logger.warning("Failed to apply conditional formatting for row %d", row)
-
-            # Add filter
-            ws.auto_filter.ref = ws.dimensions
-            logger.debug("Auto-filter applied to Excel sheet")
-
-            # Create bar chart
-            if not df.empty:
-                chart = BarChart()
-                chart.title = "Price Comparison by Site"
-                chart.x_axis.title = "Product"
-                chart.y_axis.title = "Price"
-                
-                df['numeric_price'] = prices
-                chart_data = Reference(ws, min_col=3, min_row=1, max_row=len(data)+1)
-                chart_cats = Reference(ws, min_col=2, min_row=2, max_row=len(data)+1)
-                chart.add_data(chart_data, titles_from_data=True)
-                chart.set_categories(chart_cats)
-                ws.add_chart(chart, "F5")
-                logger.debug("Bar chart added to Excel")
-
-            # Auto-adjust column widths
-            for col in ws.columns:
-                max_length = 0
-                column = col[0].column_letter
-                for cell in col:
+    async def process_query(self, query, output_format=None, detailed=False):
+        """
+        Main function to process user query.
+        Returns the result message, or with detailed=True a dict with 'query', 'status' ('ok', 'empty' or
+        'error'), 'result' (the message) and 'report' (the report path, or None).
+        """
+        output_format = output_format or self.output_format
+        outcome = await self._query_flight.do((ParseCache.normalize(query), output_format),
+                                              lambda: self._process_query(query, output_format))
+        # Coalesced callers share the outcome, so each gets its own copy
+        return dict(outcome, query=query) if detailed else outcome['result']
+
+    async def process_queries(self, queries, concurrency=4, output_format=None, detailed=False):
+        """
+        Process many queries concurrently in one event loop.
+        Args:
+            queries (list): Natural language queries
+            concurrency (int): Maximum number of queries processed at the same time
+            output_format (str): Report format for every query (defaults to the processor's)
+            detailed (bool): Return process_query's detailed dicts, each with the query's wall time in 'seconds'
+        Returns:
+            list: process_query result for each query, in input order
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(query):
+            async with semaphore:
+                if not detailed:
+                    return await self.process_query(query, output_format)
+                started = time.perf_counter()
+                outcome = await self.process_query(query, output_format, detailed=True)
+                outcome['seconds'] = round(time.perf_counter() - started, 3)
+                return outcome
+
+        logger.info("Processing %d queries with concurrency %d", len(queries), concurrency)
+        # One browser session spans the batch so an implicitly started pool is not relaunched per query
+        async with self._browser_session():
+            return await asyncio.gather(*(run(query) for query in queries))
+
+    async def run_pipeline(self, queries, parse_workers=4, workflow_workers=1, scrape_workers=4, report_workers=2,
+                           queue_size=16, output_format=None):
+        """
+        Process a batch of queries as a staged pipeline: parse -> workflow -> scrape -> report.
+        Each stage is a pool of workers connected to the next by a bounded queue, so all stages overlap
+        and a slow stage applies backpressure upstream instead of letting work pile up in memory.
+        Args:
+            queries (list): Natural language queries
+            parse_workers, workflow_workers, scrape_workers, report_workers (int): Workers per stage
+            queue_size (int): Capacity of each queue between stages
+            output_format (str): Report format for every query (defaults to the processor's)
+        Returns:
+            list: process_query-style result message for each query, in input order
+        """
+        output_format = output_format or self.output_format
+        results = [None] * len(queries)
+        trace_ids = [uuid.uuid4().hex[:12] for _ in queries]
+        parse_queue, workflow_queue, scrape_queue, report_queue = (asyncio.Queue(maxsize=queue_size) for _ in range(4))
+
+        async def report(query, scraped):
+            if not scraped:
+                logger.warning("No results found for query: %s", query)
+                return "No results found for the query."
+            filename = await self.generate_report(scraped, query, output_format)
+            return f"{REPORT_EXPORTERS[output_format].label} report generated: {filename}"
+
+        stages = [
+            ("parse", parse_queue, workflow_queue, parse_workers, lambda query, _: self.parse_query(query)),
+            ("workflow", workflow_queue, scrape_queue, workflow_workers,
+             lambda query, parsed: self.generate_mcp_workflow(parsed)),
+            ("scrape", scrape_queue, report_queue, scrape_workers,
+             lambda query, workflow: self.scrape_workflow(workflow)),
+            ("report", report_queue, None, report_workers, report),
+        ]
+
+        async def run_stage(position):
+            name, inbox, outbox, workers, handler = stages[position]
+
+            async def worker():
+                while True:
+                    item = await inbox.get()
+                    if item is None:
+                        return
+                    index, query, value = item
                     try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                ws.column_dimensions[column].width = adjusted_width
-            logger.debug("Adjusted column widths in Excel")
-
-            # Save file
-            filename = f"query_report_{uuid.uuid4().hex[:8]}.xlsx"
-            wb.save(filename)
-            logger.info("Excel report saved: %s", filename)
-            return filename
-        except Exception as e:
-            logger.error("Error creating Excel report: %s", str(e), exc_info=True)
-            raise
+                        # Stage spans of one query share a trace even though different workers run them
+                        with self.latency.bind(trace_ids[index]):
+                            value = await handler(query, value)
+                    except Exception as e:
+                        logger.error("Pipeline stage %s failed for query '%s': %s", name, query, str(e), exc_info=True)
+                        results[index] = f"Error processing query: {str(e)}"
+                        continue
+                    if outbox is None:
+                        results[index] = value
+                    else:
+                        await outbox.put((index, query, value))
+
+            await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+            logger.debug("Pipeline stage %s drained", name)
+            if outbox is not None:
+                # One sentinel per downstream worker tells the next stage that no more work is coming
+                for _ in range(max(1, stages[position + 1][3])):
+                    await outbox.put(None)
+
+        async def feed():
+            for index, query in enumerate(queries):
+                await parse_queue.put((index, query, None))
+            for _ in range(max(1, parse_workers)):
+                await parse_queue.put(None)
 
-    async def process_query(self, query):
-        """Main function to process user query"""
+        logger.info("Running pipeline for %d queries (parse=%d, workflow=%d, scrape=%d, report=%d, queue=%d)",
+                    len(queries), parse_workers, workflow_workers, scrape_workers, report_workers, queue_size)
+        async with self._browser_session():
+            await asyncio.gather(feed(), *(run_stage(position) for position in range(len(stages))))
+        return results
+
+    @traced("query")
+    async def _process_query(self, query, output_format):
         logger.info("Starting query processing for: %s", query)
         try:
             # Step 1: Parse query
@@ -344,58 +2046,138 @@ class QueryProcessor:
             workflow = await self.generate_mcp_workflow(parsed_query)
             
             # Step 3: Scrape data
-            all_results = []
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                page = await browser.new_page()
-                
-                # Handle dialogs
-                async def handle_dialog(dialog):
-                    logger.info("Dialog detected: %s", dialog.message())
-                    await dialog.accept()
-                page.on("dialog", handle_dialog)
-                logger.debug("Dialog handler set up")
-
-                for site_workflow in workflow:
-                    site_results = await self.scrape_site(page, site_workflow['site'], site_workflow['steps'])
-                    all_results.extend(site_results)
-                
-                await page.close()
-                await browser.close()
-                logger.debug("Browser and page closed")
+            async with self._browser_session():
+                all_results = await self.scrape_workflow(workflow)
             
-            # Step 4: Generate Excel report
+            # Step 4: Generate report
             if all_results:
-                filename = self.create_excel_report(all_results, query)
+                filename = await self.generate_report(all_results, query, output_format)
                 logger.info("Query processing completed successfully")
-                return f"Excel report generated: {filename}"
+                return {'query': query, 'status': 'ok', 'report': filename,
+                        'result': f"{REPORT_EXPORTERS[output_format].label} report generated: {filename}"}
             else:
                 logger.warning("No results found for query: %s", query)
-                return "No results found for the query."
+                return {'query': query, 'status': 'empty', 'report': None, 'result': "No results found for the query."}
                 
         except Exception as e:
             logger.error("Error processing query '%s': %s", query, str(e), exc_info=True)
-            return f"Error processing query: {str(e)}"
-        finally:
-            # Ensure event loop cleanup
-            try:
-                loop = asyncio.get_running_loop()
-                tasks = [task for task in asyncio.all_tasks(loop) if task is not asyncio.current_task(loop)]
-                for task in tasks:
-                    task.cancel()
-                loop.run_until_complete(loop.shutdown_asyncgens())
-            except Exception as e:
-                logger.error("Error during event loop cleanup: %s", str(e), exc_info=True)
+            return {'query': query, 'status': 'error', 'report': None, 'result': f"Error processing query: {str(e)}"}
+
+def read_queries(source):
+    """
+    Read queries from a file or stdin ('-'): one per line, or JSON Lines objects with a 'query' field.
+    Blank lines and '#' comments are ignored; malformed JSON records are logged and skipped.
+    """
+    handle = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        queries = []
+        for number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                # One malformed record is skipped rather than aborting the whole batch
+                try:
+                    query = json.loads(line)["query"]
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning("Skipping malformed query record at %s:%d: %s", source, number, str(e))
+                    continue
+                if not isinstance(query, str) or not query.strip():
+                    logger.warning("Skipping query record without query text at %s:%d", source, number)
+                    continue
+                queries.append(query)
+            else:
+                queries.append(line)
+        return queries
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+async def run_batch(processor, queries, concurrency=4, output_format=None):
+    """Process queries concurrently and return a summary record (status, result, report and timing) per query"""
+    records = await processor.process_queries(queries, concurrency, output_format, detailed=True)
+    for record in records:
+        logger.info("Query finished in %.2fs (%s): %s", record["seconds"], record["status"], record["query"])
+    return records
 
-async def main():
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Search products with natural language queries and export reports")
+    parser.add_argument("input", nargs="?", help="File of queries (one per line or JSON Lines), '-' for stdin")
+    parser.add_argument("-q", "--query", action="append", default=[], help="Query to process (repeatable)")
+    parser.add_argument("--provider", default="ollama", choices=["groq", "openai", "ollama", "fake", "replay"],
+                        help="LLM provider")
+    parser.add_argument("--replay-file", default=None, help="Recorded parses for the replay provider")
+    parser.add_argument("--record-file", default=None, help="Append every LLM parse to this JSON Lines file")
+    parser.add_argument("--model", default="llama3", help="Ollama model name")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Queries processed at the same time")
+    parser.add_argument("--browsers", type=int, default=1, help="Browsers kept in the browser pool")
+    parser.add_argument("--item-limit", type=int, default=5, help="Items scraped per site")
+    parser.add_argument("-f", "--format", default="excel", choices=sorted(REPORT_EXPORTERS), help="Report format")
+    parser.add_argument("-o", "--output-dir", default=None, help="Directory for report files")
+    parser.add_argument("--cache", default=os.path.join("cache", "parse_cache.sqlite3"),
+                        help="Parse cache SQLite file ('' disables caching)")
+    parser.add_argument("--summary", default=None, help="Write the JSON run summary to this file")
+    parser.add_argument("--latency-log", default=None, help="Append per-stage latency spans to this JSON Lines file")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    queries = list(args.query)
+    if args.input:
+        queries.extend(read_queries(args.input))
+    if not queries:
+        queries = ["Find me laptops under ₹50,000"]
+
+    parse_cache = ParseCache(args.cache) if args.cache else None
+    latency = LatencyRecorder(args.latency_log)
     processor = QueryProcessor(
-        llm_provider="ollama",  # Test with Ollama
-        ollama_model="llama3"
+        llm_provider=args.provider,
+        ollama_model=args.model,
+        browser_pool=BrowserPool(size=args.browsers),
+        item_limit=args.item_limit,
+        parse_cache=parse_cache,
+        output_format=args.format,
+        output_dir=args.output_dir,
+        latency=latency,
+        replay_file=args.replay_file,
+        record_file=args.record_file
     )
-    query = "Find me laptops under ₹50,000"
-    result = await processor.process_query(query)
-    print(result)
-    logger.info("Main function completed with result: %s", result)
+    started = time.perf_counter()
+    try:
+        async with processor:
+            records = await run_batch(processor, queries, args.concurrency)
+    finally:
+        if parse_cache is not None:
+            parse_cache.close()
+        latency.close()
+    elapsed = time.perf_counter() - started
+
+    seconds = sorted(record["seconds"] for record in records)
+    summary = {
+        "queries": len(records),
+        "ok": sum(1 for record in records if record["status"] == "ok"),
+        "empty": sum(1 for record in records if record["status"] == "empty"),
+        "errors": sum(1 for record in records if record["status"] == "error"),
+        "total_seconds": round(elapsed, 3),
+        "mean_query_seconds": round(sum(seconds) / len(seconds), 3),
+        "max_query_seconds": seconds[-1],
+        "latency": processor.latency.summary(),
+        "commands": processor.mcp_commands.timing_summary(),
+        "results": records,
+    }
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as handle:
+            json.dump(summary, handle, indent=2, ensure_ascii=False)
+        logger.info("Run summary written to %s", args.summary)
+    for record in records:
+        print(f"{record['seconds']:8.2f}s  {record['status']:<5}  {record['query']}  ->  {record['result']}")
+    print(f"{summary['queries']} queries in {summary['total_seconds']:.2f}s "
+          f"({summary['ok']} ok, {summary['empty']} empty, {summary['errors']} errors)")
+    logger.info("Main function completed: %d queries in %.2fs", len(records), elapsed)
+    return summary
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import app
+from app import BrowserPool, FakeLLMClient, QueryProcessor, build_report, normalize_prices
+from fake_site_server import FakeSiteServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [10, 1000, 100000, 1000000]
+QUICK_SIZES = [10, 1000, 10000]
+# build_excel_report's default: lists at least this long are streamed anyway
+STREAMING_REPORT_THRESHOLD = 50000
+SAMPLE_QUERIES = [
+    "Find me laptops under ₹50,000",
+    "Find me trimmers under ₹1000",
+    "Compare the prices of iPhone 14 on Amazon and Flipkart",
+    "wireless earbuds under 2k on flipkart",
+    "gaming mouse below $50 on amazon",
+    "something nice for a new flat",
+]
+
+
+def iter_synthetic_records(count):
+    """Result records shaped like scrape_site output, generated lazily"""
+    sites = ["Amazon", "Flipkart"]
+    for index in range(count):
+        yield {
+            'site': sites[index % 2],
+            'title': f"Synthetic product {index} with a reasonably long marketing title",
+            'price': f"₹{(index * 7919) % 99000 + 199:,}" if index % 50 else "N/A",
+            'timestamp': '2026-01-01 12:00:00',
+        }
+
+
+def synthetic_records(count):
+    return list(iter_synthetic_records(count))
+
+
+async def measure(name, func, repeat, **params):
+    """Run func (sync or async) repeat times and return a result record with median/min timings"""
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        if asyncio.iscoroutine(result):
+            await result
+        runs.append(time.perf_counter() - started)
+    record = {
+        'name': name,
+        'params': params,
+        'median_seconds': round(statistics.median(runs), 6),
+        'min_seconds': round(min(runs), 6),
+        'runs': [round(run, 6) for run in runs],
+    }
+    logger.info("%-32s %-40s median %.4fs", name, json.dumps(params, ensure_ascii=False), record['median_seconds'])
+    return record
+
+
+async def bench_parse(repeat):
+    processor = QueryProcessor("fake", fast_path=False, fake_llm=FakeLLMClient(['amazon', 'flipkart'], latency=0))
+    fast_processor = QueryProcessor("fake", fake_llm=FakeLLMClient(['amazon', 'flipkart'], latency=0))
+    queries = SAMPLE_QUERIES * 50
+
+    async def parse_each(target):
+        for query in queries:
+            await target.parse_query(query)
+
+    return [
+        await measure("parse_query", lambda: parse_each(processor), repeat, queries=len(queries), fast_path=False),
+        await measure("parse_query", lambda: parse_each(fast_processor), repeat, queries=len(queries), fast_path=True),
+        await measure("parse_queries", lambda: processor.parse_queries(queries, batch_size=20), repeat,
+                      queries=len(queries), batch_size=20),
+    ]
+
+
+async def bench_workflow(repeat):
+    processor = QueryProcessor("fake", fake_llm=FakeLLMClient(['amazon', 'flipkart'], latency=0))
+    parsed = await processor.parse_query("Find me laptops under ₹50,000")
+
+    async def generate():
+        for _ in range(1000):
+            await processor.generate_mcp_workflow(parsed)
+
+    return [await measure("generate_mcp_workflow", generate, repeat, calls=1000)]
+
+
+async def bench_scrape(repeat, item_counts=(5, 200)):
+    results = []
+    pool = BrowserPool()
+    try:
+        await pool.start()
+    except Exception as e:
+        logger.warning("Skipping scrape benchmarks, browser unavailable: %s", e)
+        return [{'name': 'scrape_site', 'params': {}, 'skipped': str(e)}]
+    try:
+        for items in item_counts:
+            with FakeSiteServer(items=items) as server:
+                for batch_extraction in (True, False):
+                    processor = QueryProcessor("fake", supported_sites=server.supported_sites(), browser_pool=pool,
+                                               item_limit=items, batch_extraction=batch_extraction)
+                    parsed = await processor.parse_query("laptops under ₹50,000 on amazon")
+                    workflow = await processor.generate_mcp_workflow(parsed)
+
+                    async def scrape():
+                        async with pool.page() as page:
+                            await processor.scrape_site(page, 'amazon', workflow[0]['steps'])
+
+                    results.append(await measure("scrape_site", scrape, repeat, items=items,
+                                                 batch_extraction=batch_extraction))
+    finally:
+        await pool.stop()
+    return results
+
+
+async def bench_prices(repeat, sizes):
+    results = []
+    for size in sizes:
+        prices = [record['price'] for record in synthetic_records(size)]
+        results.append(await measure("normalize_prices", lambda: normalize_prices(prices), repeat, rows=size))
+    return results
+
+
+async def bench_reports(repeat, sizes):
+    """
+    Time both Excel writers: the in-memory openpyxl report for lists below the streaming threshold, and
+    the constant-memory writer fed a fresh generator on every run (a generator is always streamed).
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            if size < STREAMING_REPORT_THRESHOLD:
+                data = synthetic_records(size)
+                results.append(await measure(
+                    "create_excel_report",
+                    lambda: build_report(data, "benchmark", "excel", output_dir=directory, max_output_bytes=0),
+                    repeat, rows=size, streaming=False
+                ))
+            results.append(await measure(
+                "create_excel_report",
+                lambda: build_report(iter_synthetic_records(size), "benchmark", "excel", output_dir=directory,
+                                     max_output_bytes=0),
+                repeat, rows=size, streaming=True
+            ))
+    return results
+
+
+def result_key(record):
+    return f"{record['name']} {json.dumps(record['params'], sort_keys=True, ensure_ascii=False)}"
+
+
+def compare(current, baseline, threshold):
+    """Compare two benchmark runs; returns rows with the median ratio and a status per benchmark"""
+    baseline_by_key = {result_key(record): record for record in baseline['results'] if 'median_seconds' in record}
+    rows = []
+    for record in current['results']:
+        key = result_key(record)
+        previous = baseline_by_key.get(key)
+        if 'median_seconds' not in record or previous is None:
+            rows.append({'benchmark': key, 'status': 'skipped' if 'skipped' in record else 'new'})
+            continue
+        ratio = record['median_seconds'] / previous['median_seconds'] if previous['median_seconds'] else float('inf')
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+        elif ratio < 1 - threshold:
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append({
+            'benchmark': key,
+            'baseline_seconds': previous['median_seconds'],
+            'current_seconds': record['median_seconds'],
+            'ratio': round(ratio, 3),
+            'status': status,
+        })
+    return rows
+
+
+def print_comparison(rows):
+    width = max((len(row['benchmark']) for row in rows), default=10)
+    print(f"{'benchmark':<{width}}  {'baseline':>10}  {'current':>10}  {'ratio':>7}  status")
+    for row in rows:
+        if 'ratio' in row:
+            print(f"{row['benchmark']:<{width}}  {row['baseline_seconds']:>10.4f}  {row['current_seconds']:>10.4f}  "
+                  f"{row['ratio']:>7.3f}  {row['status']}")
+        else:
+            print(f"{row['benchmark']:<{width}}  {'-':>10}  {'-':>10}  {'-':>7}  {row['status']}")
+
+
+async def run(args):
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    suites = {
+        'parse': lambda: bench_parse(args.repeat),
+        'workflow': lambda: bench_workflow(args.repeat),
+        'scrape': lambda: bench_scrape(args.repeat),
+        'prices': lambda: bench_prices(args.repeat, sizes),
+        'reports': lambda: bench_reports(args.repeat, sizes),
+    }
+    results = []
+    for name in args.only or list(suites):
+        logger.info("Running %s benchmarks", name)
+        results.extend(await suites[name]())
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the query processing hot paths")
+    parser.add_argument("--only", nargs="+", choices=["parse", "workflow", "scrape", "prices", "reports"],
+                        help="Run only these suites")
+    parser.add_argument("--sizes", type=int, nargs="+", help="Row counts for price and report benchmarks")
+    parser.add_argument("--quick", action="store_true", help=f"Use small sizes {QUICK_SIZES}")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark (the median is reported)")
+    parser.add_argument("--output", default=None, help="Write this run's results to a JSON file")
+    parser.add_argument("--save-baseline", default=None, help="Write this run's results as a baseline JSON file")
+    parser.add_argument("--compare", default=None, help="Baseline JSON file to compare this run against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown flagged as a regression")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    app.logger.setLevel(logging.WARNING)
+    logging.getLogger("fake_site_server").setLevel(logging.WARNING)
+
+    current = asyncio.run(run(args))
+    for path in (args.output, args.save_baseline):
+        if path:
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(path, "w", encoding="utf-8") as handle:
+                json.dump(current, handle, indent=2, ensure_ascii=False)
+            logger.info("Benchmark results written to %s", path)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        rows = compare(current, baseline, args.threshold)
+        print_comparison(rows)
+        if any(row['status'] == 'REGRESSION' for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import argparse
+import html
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+ADJECTIVES = ["Pro", "Max", "Lite", "Ultra", "Neo", "Prime", "Plus", "Air", "Edge", "Nova"]
+TINY_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+def _synthetic_items(site, term, count, seed):
+    """Deterministic fake products for a search term"""
+    rng = random.Random(f"{seed}:{site}:{term}")
+    name = term.strip().title() or "Product"
+    items = []
+    for index in range(count):
+        price = rng.randint(199, 99999)
+        title = f"{name} {rng.choice(ADJECTIVES)} {rng.randint(100, 999)} ({index + 1})"
+        if site == "amazon":
+            items.append((title, f"₹{price:,}.00"))
+        else:
+            items.append((title, f"₹{price:,}"))
+    return items
+
+
+def render_amazon(term, items, padding, image_count):
+    rows = []
+    for index, (title, price) in enumerate(items):
+        images = "".join(f'<img src="/img/amazon/{index}-{i}.png" alt="">' for i in range(image_count))
+        rows.append(
+            '<div class="s-result-item" data-component-type="s-search-result">'
+            f'{images}<h2><a href="#"><span>{html.escape(title)}</span></a></h2>'
+            f'<span class="a-price"><span class="a-offscreen">{html.escape(price)}</span>'
+            f'<span aria-hidden="true">{html.escape(price)}</span></span></div>'
+        )
+    return _page(f"Amazon.in : {html.escape(term)}", "".join(rows), padding)
+
+
+def render_flipkart(term, items, padding, image_count):
+    rows = []
+    for index, (title, price) in enumerate(items):
+        images = "".join(f'<img src="/img/flipkart/{index}-{i}.png" alt="">' for i in range(image_count))
+        rows.append(
+            f'<div class="_1AtVbE"><div>{images}<a class="s1Q9rs" href="#">{html.escape(title)}</a>'
+            f'<div class="_30jeq3">{html.escape(price)}</div></div></div>'
+        )
+    search = (f'<form action="/flipkart/s" method="get"><input type="text" name="q" value="{html.escape(term)}">'
+              '</form>')
+    return _page(f"{html.escape(term)} - Buy Products Online at Best Price", search + "".join(rows), padding)
+
+
+def _page(title, body, padding):
+    # Page weight is padded with an inert comment so transfer size can be tuned without changing the DOM
+    filler = f"<!-- {'x' * padding} -->" if padding else ""
+    return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{title}</title></head>"
+            f"<body>{body}{filler}</body></html>")
+
+
+RENDERERS = {
+    'amazon': render_amazon,
+    'flipkart': render_flipkart,
+}
+
+
+class FakeSiteServer:
+    def __init__(self, host="127.0.0.1", port=0, items=20, latency=0.0, jitter=0.0, page_bytes=0,
+                 images_per_item=0, image_bytes=20000, pages_dir=None, seed=0):
+        """
+        Local HTTP server imitating Amazon/Flipkart search pages with the selectors scrape_site uses.
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind (0 picks a free port)
+            items (int): Result items per search page
+            latency (float): Artificial delay in seconds before every response
+            jitter (float): Extra random delay in seconds (uniform 0..jitter)
+            page_bytes (int): Padding added to each search page
+            images_per_item (int): <img> tags per item (exercises request blocking)
+            image_bytes (int): Size of every served image
+            pages_dir (str): Directory of recorded pages (<site>.html) served instead of synthetic ones
+            seed (int): Seed for the synthetic titles and prices
+        """
+        self.items = items
+        self.latency = latency
+        self.jitter = jitter
+        self.page_bytes = page_bytes
+        self.images_per_item = images_per_item
+        self.image_bytes = image_bytes
+        self.pages_dir = pages_dir
+        self.seed = seed
+        self.requests = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def supported_sites(self):
+        """Mapping to pass as QueryProcessor(supported_sites=...) so workflows target this server"""
+        return {site: f"{self.url}/{site}" for site in RENDERERS}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-site-server", daemon=True)
+        self._thread.start()
+        logger.info("Fake site server listening on %s", self.url)
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def render(self, site, term):
+        """HTML for a search page: the recorded page if one exists, otherwise synthetic results"""
+        if self.pages_dir:
+            recorded = os.path.join(self.pages_dir, f"{site}.html")
+            if os.path.exists(recorded):
+                with open(recorded, encoding="utf-8") as handle:
+                    return handle.read()
+        items = _synthetic_items(site, term, self.items, self.seed)
+        return RENDERERS[site](term, items, self.page_bytes, self.images_per_item)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0)
+                if delay:
+                    time.sleep(delay)
+                parsed = urlparse(self.path)
+                parts = parsed.path.strip("/").split("/")
+                if parts[0] == "img":
+                    body = TINY_PNG + b"\0" * max(0, server.image_bytes - len(TINY_PNG))
+                    return self._send(200, "image/png", body)
+                if len(parts) == 2 and parts[0] in RENDERERS and parts[1] == "s":
+                    params = parse_qs(parsed.query)
+                    term = (params.get("k") or params.get("q") or [""])[0]
+                    return self._send(200, "text/html; charset=utf-8", server.render(parts[0], term).encode("utf-8"))
+                return self._send(404, "text/plain", b"Not found")
+
+            def _send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("Fake site request: " + format, *args)
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve fake Amazon/Flipkart search pages for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--items", type=int, default=20, help="Result items per page")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay per response in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random delay per response in seconds")
+    parser.add_argument("--page-bytes", type=int, default=0, help="Padding added to each search page")
+    parser.add_argument("--images-per-item", type=int, default=0, help="<img> tags per result item")
+    parser.add_argument("--image-bytes", type=int, default=20000, help="Size of each served image")
+    parser.add_argument("--pages-dir", default=None, help="Directory with recorded <site>.html pages")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    server = FakeSiteServer(args.host, args.port, items=args.items, latency=args.latency, jitter=args.jitter,
+                            page_bytes=args.page_bytes, images_per_item=args.images_per_item,
+                            image_bytes=args.image_bytes, pages_dir=args.pages_dir)
+    server.start()
+    print(f"Serving fake sites at {server.url}: " + ", ".join(f"{k}={v}" for k, v in server.supported_sites().items()))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import io
+import logging
+
+from app import read_queries
+
+
+def test_read_queries_mixes_plain_lines_and_json_records(tmp_path):
+    path = tmp_path / "queries.txt"
+    path.write_text('# laptops first\nFind me laptops under ₹50,000\n\n{"query": "trimmers under 1000"}\n',
+                    encoding="utf-8")
+    assert read_queries(str(path)) == ["Find me laptops under ₹50,000", "trimmers under 1000"]
+
+
+def test_read_queries_skips_malformed_records(tmp_path, caplog):
+    path = tmp_path / "queries.jsonl"
+    path.write_text('{"query": "first"}\n{"text": "no query"}\n{"query": \n{"query": 5}\n{"query": "last"}\n',
+                    encoding="utf-8")
+    with caplog.at_level(logging.WARNING, logger="app"):
+        assert read_queries(str(path)) == ["first", "last"]
+    assert [f"{path}:{number}" in caplog.text for number in (2, 3, 4)] == [True, True, True]
+
+
+def test_read_queries_from_stdin(monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("phones on amazon\n"))
+    assert read_queries("-") == ["phones on amazon"]
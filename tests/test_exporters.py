@@ -0,0 +1,82 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from app import ChunkedReportExporter, ExcelExporter, ReportExporter, build_report
+
+RECORDS = [
+    {'site': 'Amazon', 'title': 'Laptop A', 'price': '₹45,999', 'timestamp': '2026-01-01 12:00:00'},
+    {'site': 'Flipkart', 'title': 'Laptop B', 'price': 'N/A', 'timestamp': '2026-01-01 12:00:00'},
+    {'site': 'Flipkart', 'title': 'Laptop C', 'price': '₹39,990', 'timestamp': '2026-01-01 12:00:00'},
+]
+
+
+def test_exporter_base_classes_are_abstract():
+    with pytest.raises(TypeError):
+        ReportExporter()
+    with pytest.raises(TypeError):
+        ChunkedReportExporter()
+    assert isinstance(ExcelExporter(), ReportExporter)
+
+
+def test_chunked_exporter_sees_every_chunk():
+    class CountingExporter(ChunkedReportExporter):
+        extension = "txt"
+        label = "Counting"
+
+        def write_chunk(self, df, handle, first):
+            handle.write(f"{len(df)}{'*' if first else ''};".encode("utf-8"))
+
+    content = build_report_with(CountingExporter(chunk_size=2), RECORDS)
+    assert content == b"2*;1;"
+
+
+def build_report_with(exporter, records):
+    buffer = io.BytesIO()
+    exporter.export(records, "counting", buffer)
+    return buffer.getvalue()
+
+
+def test_csv_report_has_typed_columns():
+    df = pd.read_csv(io.BytesIO(build_report(RECORDS, "laptops", "csv", output="memory")))
+    assert list(df.columns) == ['site', 'title', 'price', 'price_value', 'currency', 'timestamp']
+    assert df['price_value'].tolist()[0] == 45999.0
+    assert pd.isna(df['price_value'][1])
+
+
+def test_empty_csv_report_still_has_headers():
+    text = build_report([], "nothing", "csv", output="memory").decode("utf-8")
+    assert text.strip() == "site,title,price,price_value,currency,timestamp"
+
+
+def test_jsonl_report_writes_one_record_per_line():
+    lines = build_report(iter(RECORDS), "laptops", "jsonl", output="memory").decode("utf-8").splitlines()
+    assert [json.loads(line)['title'] for line in lines] == ['Laptop A', 'Laptop B', 'Laptop C']
+
+
+def test_parquet_report_roundtrip():
+    pytest.importorskip("pyarrow")
+    df = pd.read_parquet(io.BytesIO(build_report(RECORDS, "laptops", "parquet", output="memory")))
+    assert df['currency'].isna().tolist() == [False, True, False]
+    assert df['price_value'][0] == 45999.0
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_excel_report_layout(streaming):
+    data = iter(RECORDS) if streaming else RECORDS
+    content = build_report(data, "laptops", "excel", output="memory", streaming=streaming)
+    ws = load_workbook(io.BytesIO(content)).active
+    assert [cell.value for cell in ws[1]][:5] == ['Site', 'Product Title', 'Price', 'Timestamp', 'Price Value']
+    assert ws['E2'].value == 45999.0 and ws['E3'].value is None
+    assert ws.column_dimensions['E'].hidden
+    rule = ws.conditional_formatting._cf_rules
+    formulas = [r.formula[0] for rules in rule.values() for r in rules]
+    assert formulas == ["AND(ISNUMBER($E2),$E2<AVERAGE($E$2:$E$4))"]
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        build_report(RECORDS, "laptops", "xml")
@@ -0,0 +1,43 @@
+import asyncio
+
+from app import FakeLLMClient, LatencyRecorder, MCPCommandRegistry, QueryProcessor
+
+
+def test_spans_nest_and_summarize():
+    latency = LatencyRecorder()
+    with latency.span("query"):
+        with latency.span("parse") as attributes:
+            attributes['cached'] = True
+    parse, query = latency.records
+    assert (parse['path'], query['path']) == ("query/parse", "query")
+    assert parse['trace_id'] == query['trace_id'] and parse['cached'] is True
+    assert {row['span'] for row in latency.summary()} == {"query", "parse"}
+
+
+def test_jsonl_log_is_flushed_on_close(tmp_path):
+    path = tmp_path / "latency.jsonl"
+    latency = LatencyRecorder(str(path), flush_interval=3600)
+    for _ in range(3):
+        with latency.span("stage"):
+            pass
+    latency.close()
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 3
+
+
+def test_scrape_steps_record_nested_spans_per_command():
+    registry = MCPCommandRegistry()
+
+    @registry.register("noop", timeout=1)
+    async def noop(page, step):
+        return None
+
+    processor = QueryProcessor("fake", fake_llm=FakeLLMClient(['amazon'], latency=0), mcp_commands=registry)
+
+    async def main():
+        with processor.latency.span("site"):
+            await processor.scrape_site(None, "nowhere", [{'command': "noop"}, {'command': "noop"}])
+
+    asyncio.run(main())
+    steps = [record for record in processor.latency.records if record['span'] == "step"]
+    assert [(record['path'], record['command']) for record in steps] == [("site/step", "noop")] * 2
+    assert [row['span'] for row in processor.latency.summary()].count("step:noop") == 1
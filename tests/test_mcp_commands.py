@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+from app import MCP_COMMANDS, MCPCommandRegistry
+
+
+def run(registry, command, **kwargs):
+    async def main():
+        deadline = kwargs.pop('deadline', None)
+        if deadline is not None:
+            deadline += asyncio.get_running_loop().time()
+        return await registry.execute(None, {'command': command}, "test", deadline=deadline, **kwargs)
+    return asyncio.run(main())
+
+
+def test_success_is_recorded():
+    registry = MCPCommandRegistry()
+
+    @registry.register("noop", timeout=1)
+    async def noop(page, step):
+        return None
+
+    assert run(registry, "noop") is True
+    assert registry.timing_summary()[0]['command'] == "noop"
+    assert registry.stats["noop"]['calls'] == 1 and registry.stats["noop"]['errors'] == 0
+
+
+def test_failures_are_retried():
+    registry = MCPCommandRegistry()
+    attempts = []
+
+    @registry.register("flaky", timeout=1, retries=2, backoff=0)
+    async def flaky(page, step):
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise RuntimeError("transient")
+
+    assert run(registry, "flaky") is True
+    assert len(attempts) == 2
+    assert registry.stats["flaky"]['errors'] == 1
+
+
+def test_timeouts_fail_the_step_without_raising():
+    registry = MCPCommandRegistry()
+
+    @registry.register("hang", timeout=0.05)
+    async def hang(page, step):
+        await asyncio.sleep(10)
+
+    started = time.perf_counter()
+    assert run(registry, "hang") is False
+    assert time.perf_counter() - started < 1
+    assert registry.stats["hang"]['errors'] == 1
+
+
+def test_retries_stop_at_the_deadline():
+    registry = MCPCommandRegistry()
+    attempts = []
+
+    @registry.register("hang", timeout=0.2, retries=5, backoff=0.01)
+    async def hang(page, step):
+        attempts.append(1)
+        await asyncio.sleep(10)
+
+    started = time.perf_counter()
+    assert run(registry, "hang", deadline=0.3) is False
+    assert time.perf_counter() - started < 0.5
+    assert len(attempts) == 2
+
+
+def test_unknown_commands_are_skipped():
+    assert run(MCPCommandRegistry(), "missing") is False
+
+
+def test_copy_shares_commands_but_not_stats():
+    registry = MCP_COMMANDS.copy()
+    assert "browser_navigate" in registry
+    assert registry.stats == {}
+
+
+def test_handler_timeouts_without_a_command_timeout_are_logged_not_raised():
+    registry = MCPCommandRegistry()
+
+    @registry.register("inner_timeout", timeout=None)
+    async def inner_timeout(page, step):
+        await asyncio.wait_for(asyncio.sleep(10), timeout=0.01)
+
+    assert run(registry, "inner_timeout") is False
+    assert registry.stats["inner_timeout"]['errors'] == 1
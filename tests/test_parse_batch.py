@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import app
+from app import FakeLLMClient, QueryProcessor
+
+QUERIES = [f"unusual request number {index}" for index in range(10)]
+
+
+class RecordingClient(FakeLLMClient):
+    """Fake provider logging every request and dropping chosen queries from the first batch response"""
+
+    def __init__(self, drop=(), **kwargs):
+        super().__init__(['amazon', 'flipkart'], latency=0, **kwargs)
+        self.drop = set(drop)
+        self.calls = []
+
+    async def complete(self, queries, batch=False):
+        self.calls.append((list(queries), batch))
+        response = await super().complete(queries, batch)
+        if batch and len(self.calls) == 1:
+            response["results"] = [entry for entry in response["results"] if queries[entry["index"]] not in self.drop]
+        return response
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    async def no_sleep(delay, result=None):
+        return result
+    monkeypatch.setattr(app.asyncio, "sleep", no_sleep)
+
+
+def parse_all(client, batch_size=5):
+    processor = QueryProcessor("fake", fake_llm=client, fast_path=False)
+    return asyncio.run(processor.parse_queries(QUERIES, batch_size=batch_size))
+
+
+def test_one_request_per_batch():
+    client = RecordingClient()
+    results = parse_all(client)
+    assert all(result is not None for result in results)
+    assert [len(queries) for queries, _ in client.calls] == [5, 5]
+
+
+def test_only_invalid_items_are_retried():
+    client = RecordingClient(drop={QUERIES[1], QUERIES[3]}, seed=0)
+    results = parse_all(client, batch_size=10)
+    assert all(result is not None for result in results)
+    assert client.calls[0] == (QUERIES, True)
+    assert client.calls[1] == ([QUERIES[1], QUERIES[3]], True)
+    assert len(client.calls) == 2
+
+
+def test_provider_errors_retry_the_batch_without_splitting():
+    client = RecordingClient(error_rate=1.0, seed=0)
+    results = parse_all(client)
+    assert results == [None] * len(QUERIES)
+    # Two batches, three attempts each, always with the full batch
+    assert len(client.calls) == 6
+    assert all(len(queries) == 5 and batch for queries, batch in client.calls)
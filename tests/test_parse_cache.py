@@ -0,0 +1,58 @@
+import time
+
+from app import ParseCache
+
+
+def test_roundtrip_and_stats(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache.sqlite3"))
+    assert cache.get("missing") is None
+    cache.set("key", {"query_type": "product_search"})
+    assert cache.get("key") == {"query_type": "product_search"}
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+    cache.close()
+
+
+def test_entries_survive_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ParseCache(path)
+    cache.set("key", [1, 2])
+    cache.close()
+    assert ParseCache(path).get("key") == [1, 2]
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache.sqlite3"), ttl=0)
+    cache.set("key", 1)
+    assert cache.get("key") is None
+
+
+def test_memory_hits_keep_entries_from_eviction(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ParseCache(path, max_entries=2)
+    cache.set("a", 1)
+    time.sleep(0.01)
+    cache.set("b", 2)
+    for _ in range(5):
+        time.sleep(0.01)
+        assert cache.get("a") == 1
+    time.sleep(0.01)
+    cache.set("c", 3)
+    cache.close()
+
+    reopened = ParseCache(path, max_entries=2)
+    assert reopened.get("a") == 1
+    assert reopened.get("b") is None
+    assert reopened.get("c") == 3
+
+
+def test_memory_lru_is_bounded():
+    cache = ParseCache(":memory:", memory_entries=2)
+    for key in "abc":
+        cache.set(key, key)
+    assert cache.stats['memory_entries'] == 2
+    # Entries pushed out of memory are still served from SQLite
+    assert cache.get("a") == "a"
+
+
+def test_normalize():
+    assert ParseCache.normalize("  Find   me LAPTOPS?? ") == "find me laptops"
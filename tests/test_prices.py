@@ -0,0 +1,29 @@
+import math
+
+from app import add_price_columns, normalize_prices
+
+
+def test_symbols_codes_and_separators():
+    df = normalize_prices(["₹1,299", "$49.99", "Rs. 1,00,000", "€1.234,56", "USD 15"])
+    assert df['price_value'].tolist() == [1299.0, 49.99, 100000.0, 1234.56, 15.0]
+    assert df['currency'].tolist() == ['INR', 'USD', 'INR', 'EUR', 'USD']
+
+
+def test_ranges_keep_both_ends():
+    df = normalize_prices(["₹1,000 - ₹2,000", "$10 to $15"])
+    assert df['price_value'].tolist() == [1000.0, 10.0]
+    assert df['price_max'].tolist() == [2000.0, 15.0]
+
+
+def test_placeholders_are_missing_not_zero():
+    df = normalize_prices(["N/A", "", None])
+    assert df['price_value'].isna().all()
+    assert df['currency'].tolist() == [None, None, None]
+
+
+def test_add_price_columns_sets_fields_in_place():
+    records = [{'price': "₹499"}, {'price': "N/A"}]
+    assert add_price_columns(records) is records
+    assert records[0]['price_value'] == 499.0
+    assert records[0]['currency'] == 'INR'
+    assert records[1]['price_value'] is None or math.isnan(records[1]['price_value'])
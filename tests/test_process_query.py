@@ -0,0 +1,87 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app import BATCH_EXTRACT_JS, FakeLLMClient, QueryProcessor
+
+
+async def noop(*args, **kwargs):
+    return None
+
+
+class StubKeyboard:
+    press = staticmethod(noop)
+
+
+class StubPage:
+    """Page accepting every MCP command and returning one extracted item"""
+    keyboard = StubKeyboard()
+
+    def __getattr__(self, name):
+        return noop
+
+    async def evaluate(self, script, *args):
+        if script == BATCH_EXTRACT_JS:
+            return {'count': 1, 'items': [{'title': "Stub item", 'price': "₹999"}]}
+        return None
+
+
+class StubBrowserPool:
+    """BrowserPool stand-in counting start/stop calls and concurrently open pages"""
+
+    def __init__(self):
+        self.started = False
+        self.starts = 0
+        self.stops = 0
+        self.open_pages = 0
+        self.max_open_pages = 0
+
+    async def start(self):
+        self.starts += 1
+        self.started = True
+
+    async def stop(self):
+        self.stops += 1
+        self.started = False
+
+    @asynccontextmanager
+    async def page(self):
+        assert self.started, "page requested from a stopped pool"
+        self.open_pages += 1
+        self.max_open_pages = max(self.max_open_pages, self.open_pages)
+        try:
+            await asyncio.sleep(0.02)
+            yield StubPage()
+        finally:
+            self.open_pages -= 1
+
+
+def make_processor(tmp_path):
+    pool = StubBrowserPool()
+    processor = QueryProcessor("fake", browser_pool=pool, fake_llm=FakeLLMClient(['amazon', 'flipkart'], latency=0),
+                               report_executor=None, output_format="csv", output_dir=str(tmp_path))
+    return processor, pool
+
+
+def test_concurrent_queries_share_one_implicit_pool(tmp_path):
+    processor, pool = make_processor(tmp_path)
+
+    async def main():
+        return await asyncio.gather(processor.process_query("laptops under 50000", detailed=True),
+                                    processor.process_query("trimmers under 1000", detailed=True))
+
+    results = asyncio.run(main())
+    assert [result['status'] for result in results] == ['ok', 'ok']
+    assert results[0]['report'] != results[1]['report']
+    assert (pool.starts, pool.stops) == (1, 1)
+
+
+def test_process_queries_keeps_order_and_bounds_concurrency(tmp_path):
+    processor, pool = make_processor(tmp_path)
+    queries = [f"product {index} under 1000 on amazon" for index in range(6)]
+
+    results = asyncio.run(processor.process_queries(queries, concurrency=2, detailed=True))
+    assert [result['query'] for result in results] == queries
+    assert all(result['status'] == 'ok' and result['seconds'] >= 0 for result in results)
+    # One site per query, so open pages never exceed the query concurrency
+    assert pool.max_open_pages == 2
+    assert (pool.starts, pool.stops) == (1, 1)
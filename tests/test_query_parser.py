@@ -0,0 +1,66 @@
+import pytest
+
+from app import RuleBasedQueryParser
+
+
+@pytest.fixture
+def parser():
+    return RuleBasedQueryParser(['amazon', 'flipkart'])
+
+
+def test_product_budget_and_default_sites(parser):
+    result, confidence = parser.parse("Find me laptops under ₹50,000")
+    assert result == {
+        "query_type": "product_search",
+        "target_websites": ['amazon', 'flipkart'],
+        "search_params": {"category": "laptops", "budget": "₹50000", "specific_product": None},
+    }
+    assert confidence >= 0.8
+
+
+def test_price_comparison_across_sites(parser):
+    result, confidence = parser.parse("Compare the prices of iPhone 14 on Amazon and Flipkart")
+    assert result["query_type"] == "price_comparison"
+    assert result["target_websites"] == ['amazon', 'flipkart']
+    assert result["search_params"]["specific_product"] == "iPhone 14"
+    assert confidence >= 0.8
+
+
+@pytest.mark.parametrize("query, category, budget, sites", [
+    ("wireless earbuds under 2k on flipkart", "wireless earbuds", "₹2000", ['flipkart']),
+    ("gaming mouse below $50 on amazon", "gaming mouse", "$50", ['amazon']),
+    ("Show me a laptop bag under 1500 from amazon", "laptop bag", "₹1500", ['amazon']),
+    ("laptops under 1.5 lakh on flipkart", "laptops", "₹150000", ['flipkart']),
+    ("cars below 1 crore on amazon", "cars", "₹10000000", ['amazon']),
+])
+def test_budget_units_and_sites(parser, query, category, budget, sites):
+    result, confidence = parser.parse(query)
+    assert result["search_params"]["category"] == category
+    assert result["search_params"]["budget"] == budget
+    assert result["target_websites"] == sites
+    assert confidence >= 0.8
+
+
+@pytest.mark.parametrize("query", [
+    "Find me the cheapest phones on flipkart",
+    "Find me hotels in Goa under ₹5000",
+    "something nice for a new flat",
+])
+def test_unrecognized_details_fall_back_to_llm(parser, query):
+    _, confidence = parser.parse(query)
+    assert confidence < 0.8
+
+
+def test_determiners_and_ranking_words_are_stripped(parser):
+    result, _ = parser.parse("Find me the cheapest phones on flipkart")
+    assert result["search_params"]["specific_product"] == "phones"
+
+
+def test_lakh_budget_is_not_left_in_the_product(parser):
+    result, _ = parser.parse("laptops under 1.5 lakh")
+    assert result["search_params"] == {"category": "laptops", "budget": "₹150000", "specific_product": None}
+
+
+def test_flights_are_not_recognized(parser):
+    assert parser.parse("cheap flights to Goa") == (None, 0.0)
+    assert parser.parse("   ") == (None, 0.0)
@@ -0,0 +1,38 @@
+import os
+import time
+
+from app import build_report, prune_report_dir
+
+RECORDS = [{'site': 'Amazon', 'title': 'Laptop A', 'price': '₹45,999', 'timestamp': '2026-01-01 12:00:00'}]
+
+
+def make_report(directory, name, size, age):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as handle:
+        handle.write(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_prune_deletes_oldest_reports_first(tmp_path):
+    oldest = make_report(tmp_path, "query_report_a.csv", 100, age=300)
+    older = make_report(tmp_path, "query_report_b.csv", 100, age=200)
+    newest = make_report(tmp_path, "query_report_c.csv", 100, age=100)
+    other = make_report(tmp_path, "notes.txt", 1000, age=400)
+    prune_report_dir(str(tmp_path), 150)
+    assert [os.path.exists(path) for path in (oldest, older, newest, other)] == [False, False, True, True]
+
+
+def test_prune_spares_kept_and_newer_reports(tmp_path):
+    old = make_report(tmp_path, "query_report_a.csv", 100, age=300)
+    kept = make_report(tmp_path, "query_report_b.csv", 100, age=200)
+    concurrent = make_report(tmp_path, "query_report_c.csv", 100, age=0)
+    prune_report_dir(str(tmp_path), 0, keep=kept, older_than=time.time() - 50)
+    assert [os.path.exists(path) for path in (old, kept, concurrent)] == [False, True, True]
+
+
+def test_build_report_prunes_output_dir(tmp_path):
+    old = make_report(tmp_path, "query_report_old.csv", 10000, age=300)
+    path = build_report(RECORDS, "laptops", "csv", output_dir=str(tmp_path), max_output_bytes=5000)
+    assert os.path.exists(path) and not os.path.exists(old)
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["done"] * 3
+    assert len(calls) == 1
+    assert (flight.executed, flight.coalesced) == (1, 2)
+
+
+def test_keys_are_independent_and_forgotten_after_completion():
+    flight = SingleFlight()
+
+    async def main():
+        first = await asyncio.gather(flight.do("a", lambda: asyncio.sleep(0, "a")),
+                                     flight.do("b", lambda: asyncio.sleep(0, "b")))
+        second = await flight.do("a", lambda: asyncio.sleep(0, "again"))
+        return first, second
+
+    assert asyncio.run(main()) == (["a", "b"], "again")
+    assert flight.executed == 3
+
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("key", work))
+        follower = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "done"